@@ -2,15 +2,23 @@
 
 import asyncio
 import logging
+from functools import partial
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 
 from bot.config import settings
-from bot.db.database import create_db_and_tables
+from bot.db.database import create_db_and_tables, async_session_factory
 from bot.middlewares.access import AccessMiddleware
+from bot.middlewares.db_session import DbSessionMiddleware
 from bot.handlers import main_router # Импортируем главный роутер
+from bot.handlers.automation.keyboards import get_regenerate_keyboard
 from bot.scheduler import setup_scheduler
+from bot.services.render_executor import render_executor
+from bot.services.http_client import llm_http_client
+from bot.services.fal_service import close_imagen_client
+from bot.services.moodboard import moodboard_tasks
+from bot.services.generation import generation_queue, run_generation, resume_generation_jobs
 
 
 async def main():
@@ -37,6 +45,8 @@ async def main():
     
     # 1. Middleware для проверки доступа
     dp.update.middleware(AccessMiddleware(admin_id=settings.telegram_user_id))
+    # Одна сессия БД на апдейт (аргумент session в хэндлерах)
+    dp.update.middleware(DbSessionMiddleware(session_factory=async_session_factory))
     
     # 2. Роутеры
     # Сначала регистрируем общие хэндлеры
@@ -50,6 +60,15 @@ async def main():
     # --- ЗАПУСК ПЛАНИРОВЩИКА ---
     setup_scheduler(bot)
 
+    # --- ЗАПУСК ПУЛА РЕНДЕРИНГА PDF ---
+    # Прогреваем воркеры заранее, чтобы первая карточка не ждала импорта WeasyPrint
+    await render_executor.start()
+
+    # --- ЗАПУСК ОЧЕРЕДИ ГЕНЕРАЦИИ ---
+    generation_queue.start(partial(run_generation, bot, result_keyboard=get_regenerate_keyboard))
+    # Продолжаем задачи, прерванные предыдущим перезапуском
+    await resume_generation_jobs(bot)
+
     # --- ЗАПУСК БОТА ---
     try:
         # Удаляем вебхук, если он был установлен ранее
@@ -57,6 +76,11 @@ async def main():
         # Запускаем polling
         await dp.start_polling(bot)
     finally:
+        await generation_queue.stop()
+        await moodboard_tasks.shutdown()
+        await render_executor.shutdown()
+        await llm_http_client.close()
+        await close_imagen_client()
         await bot.session.close()
 
 
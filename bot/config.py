@@ -1,7 +1,9 @@
 # file: bot/config.py
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field
+from typing import Annotated
+
+from pydantic_settings import BaseSettings, SettingsConfigDict, NoDecode
+from pydantic import Field, field_validator
 
 class Settings(BaseSettings):
     """
@@ -15,12 +17,103 @@ class Settings(BaseSettings):
     # Generative AI
     llm_api_key: str
     llm_api_endpoint: str = "https://openrouter.ai/api/v1/chat/completions"
-    llm_model: str = "meta-llama/llama-3.3-70b-instruct:free"
+    # Модели в порядке предпочтения; в .env — через запятую
+    llm_model: Annotated[list[str], NoDecode] = ["meta-llama/llama-3.3-70b-instruct:free"]
     google_ai_api_key: str
 
+    # HTTP-клиент для LLM: общий пул соединений
+    llm_http2: bool = True
+    llm_timeout: float = 60.0
+    llm_max_connections: int = 10
+    llm_max_keepalive_connections: int = 5
+    llm_keepalive_expiry: float = 60.0
+    # Устойчивость запросов к LLM
+    # Попыток на каждую модель (повторы при 429/5xx и сетевых ошибках)
+    llm_retry_attempts: int = 3
+    llm_retry_base_delay: float = 1.0
+    llm_retry_max_delay: float = 30.0
+    # Дублировать запрос, если он дольше этого перцентиля недавних задержек (0 — не дублировать)
+    llm_hedge_percentile: float = 0.9
+    # Сколько замеров нужно, прежде чем начать дублировать запросы
+    llm_hedge_min_samples: int = 10
+    # Предохранитель: после стольких ошибок подряд модель пропускается на llm_circuit_reset_timeout секунд
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_reset_timeout: float = 60.0
+
+    # Клиентские лимиты запросов к AI-сервисам (0 — без ограничений).
+    # При исчерпании квоты запрос ждет, а не падает
+    llm_requests_per_minute: int = 20
+    llm_tokens_per_minute: int = 0
+    imagen_requests_per_minute: int = 5
+    # Максимальное время генерации мудборда в Imagen, в секундах
+    imagen_timeout: float = 90.0
+
+    # Мудборды: сколько наборов изображений держать в памяти и сколько, в секундах
+    moodboard_cache_size: int = 8
+    moodboard_cache_ttl: int = 24 * 3600
+    # Размер ячейки коллажа в пикселях (коллаж 2x2 получается примерно вдвое больше)
+    moodboard_collage_tile_size: int = 768
+    # Лимиты запросов в минуту для отдельных моделей, JSON: {"openrouter:<модель>": 10, "imagen:<модель>": 2}
+    rate_limit_overrides: dict[str, int] = {}
+
+    # Получать ответы LLM потоком (SSE), показывая текст по мере генерации
+    llm_stream: bool = True
+    # Генерировать текст карточки и текст для соцсетей одним JSON-запросом вместо двух.
+    # Вдвое меньше запросов при жестких лимитах, но текст для соцсетей не показывается по мере генерации
+    llm_combined_mode: bool = False
+
+    # Кэш ответов LLM: LRU в памяти + таблица в БД
+    llm_cache_enabled: bool = True
+    # Время жизни ответа в кэше, в секундах (0 — бессрочно)
+    llm_cache_ttl: int = 7 * 24 * 3600
+    # Сколько ответов держать в памяти процесса
+    llm_cache_memory_size: int = 256
+    # Максимум записей в таблице кэша (лишние удаляются при очистке)
+    llm_cache_max_rows: int = 5000
+
+    # Кэш чтений из БД (проекты, карточки, списки шаблонов) для навигации по меню
+    db_cache_enabled: bool = True
+    # Время жизни записи, в секундах: верхняя граница устаревания, если запись изменили в обход бота
+    db_cache_ttl: int = 300
+    db_cache_size: int = 512
+
+    # Рендеринг PDF
+    # Количество процессов WeasyPrint (0 — рендерить в потоке без отдельных процессов)
+    pdf_render_workers: int = 2
+    # Максимальное время рендеринга одной карточки, в секундах
+    pdf_render_timeout: float = 120.0
+    # Сколько скомпилированных шаблонов держать в кэше каждого воркера
+    template_cache_size: int = 16
+    # Профиль вывода по умолчанию: draft, screen или print
+    pdf_default_profile: str = "screen"
+
+    # Подготовка изображений перед вставкой в PDF (разрешение и качество задаются профилем вывода)
+    image_format: str = "JPEG"  # JPEG или WEBP
+    image_preprocess_workers: int = 4
+
+    # Очередь генерации: сколько пайплайнов выполняется одновременно и сколько ждут
+    generation_concurrency: int = 2
+    generation_queue_size: int = 10
+    # Сколько раз пытаться выполнить задачу, прерванную перезапуском или временным сбоем
+    generation_max_attempts: int = 3
+    # Через сколько секунд повторять задачу после сбоя сети или Telegram
+    generation_retry_delay: float = 30.0
+
+    # Сборка портфолио: сколько карточек готовить одновременно
+    portfolio_concurrency: int = 4
+    # Минимальный интервал между редактированиями статусных сообщений, в секундах
+    progress_edit_interval: float = 1.5
+
     # Настройки базы данных
     db_url: str = Field(default="sqlite+aiosqlite:///bot.db", alias="DATABASE_URL")
 
+    @field_validator("llm_model", mode="before")
+    @classmethod
+    def split_models(cls, value):
+        if isinstance(value, str):
+            return [model.strip() for model in value.split(",") if model.strip()]
+        return value
+
     # Используем SettingsConfigDict для указания источника - файла .env
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
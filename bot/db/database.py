@@ -1,12 +1,21 @@
 # file: bot/db/database.py
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
 from bot.config import settings
 from .models import Base
 from .models import Project, StatusEnum
 from .models import PdfTemplate
 from .models import ProjectAsset, AssetTypeEnum
-from sqlalchemy import select
+from .models import GenerationJob, JobStatusEnum
+from .models import LlmCacheEntry
+import datetime
+from dataclasses import dataclass, field, asdict
+from sqlalchemy import select, delete, func, event, exists
+from bot.services.generation_cache import template_content_hash
+from .read_cache import db_cache, to_snapshot, from_snapshot
 
 # Создаем асинхронный "движок" для работы с БД
 # echo=True полезно для отладки, чтобы видеть генерируемые SQL-запросы
@@ -16,6 +25,47 @@ engine = create_async_engine(settings.db_url, echo=True)
 async_session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
 
+@dataclass
+class QueryStats:
+    """Счетчики обращений к БД в рамках одного апдейта."""
+    sessions: set[int] = field(default_factory=set)
+    queries: int = 0
+
+# Счетчики текущего апдейта; выставляются DbSessionMiddleware
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = query_stats.get()
+    if stats is not None:
+        stats.queries += 1
+
+@event.listens_for(Session, "after_begin")
+def _count_session(session, transaction, connection):
+    stats = query_stats.get()
+    if stats is not None:
+        stats.sessions.add(id(session))
+
+
+@asynccontextmanager
+async def _session_scope(session: AsyncSession | None = None):
+    """
+    Возвращает сессию для функции репозитория.
+    Если передана сессия апдейта, изменения только отправляются в БД (flush),
+    а commit/rollback выполняет DbSessionMiddleware в конце апдейта.
+    Без нее открывается собственная сессия, которая фиксируется сразу.
+    """
+    if session is not None:
+        yield session
+        await session.flush()
+        return
+    async with async_session_factory() as own_session:
+        yield own_session
+        await own_session.commit()
+        await db_cache.finish_session(own_session)
+
+
 async def create_db_and_tables():
     """
     Функция для создания всех таблиц в базе данных.
@@ -28,117 +78,379 @@ async def create_db_and_tables():
     # Загружаем демо-шаблон при первом запуске
     await _load_demo_template_if_not_exists()
 
-async def create_project_idea(name: str, description: str = None) -> Project:
+TEMPLATE_SUMMARIES_KEY = "templates:summaries"
+
+
+def _project_cache_keys(project_id: int) -> list[str]:
+    """Ключи кэша, которые устаревают при изменении проекта (включая списки по всем статусам)."""
+    return [f"project:{project_id}", f"project_card:{project_id}"] + [
+        f"projects:status:{status.name}" for status in StatusEnum
+    ]
+
+
+async def create_project_idea(name: str, description: str = None, session: AsyncSession = None) -> Project:
     """
     Создает новую запись проекта в статусе 'Идея' в базе данных.
     """
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         new_project = Project(
             name=name,
             description=description,
             status=StatusEnum.IDEA
         )
         session.add(new_project)
-        await session.commit()
+        await session.flush()
         await session.refresh(new_project)
+        await db_cache.invalidate([f"projects:status:{StatusEnum.IDEA.name}"], session)
         return new_project
 
-async def update_project_after_creation(project_id: int, reminder_interval: int) -> None:
+async def update_project_after_creation(project_id: int, reminder_interval: int, session: AsyncSession = None) -> None:
     """Обновляет проект после создания, добавляя интервал напоминания."""
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         project = await session.get(Project, project_id)
         if project:
             if reminder_interval > 0:
                 project.reminder_interval_days = reminder_interval
-            await session.commit()
+        await db_cache.invalidate(_project_cache_keys(project_id), session)
 
-async def get_projects_by_status(status: StatusEnum) -> list[Project]:
+async def get_projects_by_status(status: StatusEnum, session: AsyncSession = None) -> list[Project]:
     """Возвращает список проектов по заданному статусу."""
-    async with async_session_factory() as session:
-        result = await session.execute(
-            select(Project).where(Project.status == status).order_by(Project.created_at.desc())
-        )
-        return result.scalars().all()
+    async def load():
+        async with _session_scope(session) as scope:
+            result = await scope.execute(
+                select(Project).where(Project.status == status).order_by(Project.created_at.desc())
+            )
+            return result.scalars().all()
+
+    return await db_cache.get_or_load(
+        f"projects:status:{status.name}", load,
+        dump=lambda projects: [to_snapshot(project) for project in projects],
+        restore=lambda data: [from_snapshot(Project, item) for item in data],
+        session=session
+    )
 
-async def update_project_status(project_id: int, new_status: StatusEnum):
+async def update_project_status(project_id: int, new_status: StatusEnum, session: AsyncSession = None):
     """Обновляет статус проекта."""
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         project = await session.get(Project, project_id)
         if project:
             project.status = new_status
-            await session.commit()
-            return project
-    return None
+            await db_cache.invalidate(_project_cache_keys(project_id), session)
+        return project
 
-async def delete_project(project_id: int):
-    """Удаляет проект из базы данных."""
-    async with async_session_factory() as session:
+async def delete_project(project_id: int, session: AsyncSession = None):
+    """
+    Удаляет проект из базы данных.
+    В сессии апдейта уже загруженный проект берется из identity map без повторного запроса.
+    """
+    async with _session_scope(session) as session:
         project = await session.get(Project, project_id)
         if project:
             await session.delete(project)
-            await session.commit()
+            await db_cache.invalidate(_project_cache_keys(project_id), session)
 
-async def get_project_by_id(project_id: int) -> Project | None:
+async def get_project_by_id(project_id: int, session: AsyncSession = None) -> Project | None:
     """Возвращает один проект по его ID."""
-    async with async_session_factory() as session:
-        project = await session.get(Project, project_id)
-        return project
+    async def load():
+        async with _session_scope(session) as scope:
+            return await scope.get(Project, project_id)
+
+    return await db_cache.get_or_load(
+        f"project:{project_id}", load,
+        dump=to_snapshot,
+        restore=lambda data: from_snapshot(Project, data),
+        session=session
+    )
     
-async def add_pdf_template(name: str, html_content: str, css_content: str = None):
+@dataclass(frozen=True)
+class ProjectCard:
+    """Данные для карточки проекта: сам проект, фото-референс и наличие мудборда."""
+    project: Project
+    cover_file_id: str | None
+    has_moodboard: bool
+
+
+async def get_project_card(project_id: int, session: AsyncSession = None) -> ProjectCard | None:
+    """
+    Возвращает проект вместе с данными его карточки одним запросом.
+    Фото-референс и наличие мудборда берутся коррелированными подзапросами,
+    поэтому остальные ассеты проекта не загружаются.
+    """
+    cover = (
+        select(ProjectAsset.telegram_file_id)
+        .where(ProjectAsset.project_id == Project.id, ProjectAsset.asset_type == AssetTypeEnum.IMAGE_REFERENCE)
+        .order_by(ProjectAsset.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    has_moodboard = exists().where(
+        ProjectAsset.project_id == Project.id,
+        ProjectAsset.asset_type == AssetTypeEnum.MOODBOARD_IMAGE
+    )
+    async def load():
+        async with _session_scope(session) as scope:
+            result = await scope.execute(
+                select(Project, cover.label("cover_file_id"), has_moodboard.label("has_moodboard"))
+                .where(Project.id == project_id)
+            )
+            row = result.first()
+            if row is None:
+                return None
+            return ProjectCard(project=row.Project, cover_file_id=row.cover_file_id, has_moodboard=bool(row.has_moodboard))
+
+    return await db_cache.get_or_load(
+        f"project_card:{project_id}", load,
+        # Без asdict: он рекурсивно копировал бы ORM-объект вместе с состоянием SQLAlchemy
+        dump=lambda card: {
+            "project": to_snapshot(card.project),
+            "cover_file_id": card.cover_file_id,
+            "has_moodboard": card.has_moodboard
+        },
+        restore=lambda data: ProjectCard(**{**data, "project": from_snapshot(Project, data["project"])}),
+        session=session
+    )
+
+async def add_pdf_template(name: str, html_content: str, css_content: str = None, session: AsyncSession = None) -> PdfTemplate:
     """Добавляет новый шаблон PDF в базу данных."""
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         new_template = PdfTemplate(
             name=name,
             html_template=html_content,
-            css_template=css_content
+            css_template=css_content,
+            content_hash=template_content_hash(html_content, css_content)
         )
         session.add(new_template)
-        await session.commit()
+        await session.flush()
+        await db_cache.invalidate([TEMPLATE_SUMMARIES_KEY], session)
+        return new_template
 
-async def get_all_templates() -> list[PdfTemplate]:
-    """Возвращает все сохраненные шаблоны PDF."""
-    async with async_session_factory() as session:
-        result = await session.execute(select(PdfTemplate).order_by(PdfTemplate.name))
-        return result.scalars().all()
-    
-async def get_template_by_id(template_id: int) -> PdfTemplate | None:
+@dataclass(frozen=True)
+class TemplateSummary:
+    """Легкое описание шаблона для списков: без HTML и CSS."""
+    id: int
+    name: str
+    size: int  # Длина HTML + CSS в символах
+    content_hash: str | None
+
+
+async def get_template_summaries(session: AsyncSession = None) -> list[TemplateSummary]:
+    """
+    Возвращает список шаблонов без их содержимого.
+    Размер считается на стороне БД, поэтому тела шаблонов не читаются в память.
+    """
+    size = func.length(PdfTemplate.html_template) + func.coalesce(func.length(PdfTemplate.css_template), 0)
+
+    async def load():
+        async with _session_scope(session) as scope:
+            result = await scope.execute(
+                select(PdfTemplate.id, PdfTemplate.name, size.label("size"), PdfTemplate.content_hash)
+                .order_by(PdfTemplate.name)
+            )
+            return [TemplateSummary(*row) for row in result.all()]
+
+    return await db_cache.get_or_load(
+        TEMPLATE_SUMMARIES_KEY, load,
+        dump=lambda templates: [asdict(template) for template in templates],
+        restore=lambda data: [TemplateSummary(**item) for item in data],
+        session=session
+    )
+
+async def templates_exist(session: AsyncSession = None) -> bool:
+    """Проверяет, есть ли хотя бы один шаблон."""
+    async with _session_scope(session) as session:
+        return await session.scalar(select(PdfTemplate.id).limit(1)) is not None
+
+async def get_template_by_id(template_id: int, session: AsyncSession = None) -> PdfTemplate | None:
     """Возвращает один шаблон PDF по его ID."""
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         template = await session.get(PdfTemplate, template_id)
         return template
     
-async def update_project_details(project_id: int, name: str = None, description: str = None):
+async def update_project_details(project_id: int, name: str = None, description: str = None, session: AsyncSession = None):
     """Обновляет название и/или описание проекта."""
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         project = await session.get(Project, project_id)
         if project:
             if name:
                 project.name = name
             if description:
                 project.description = description
-            await session.commit()
-            return project
-    return None
+            await db_cache.invalidate(_project_cache_keys(project_id), session)
+        return project
 
-async def add_project_asset(project_id: int, asset_type: AssetTypeEnum, telegram_file_id: str):
-    """Добавляет ассет (например, фото) к проекту."""
-    async with async_session_factory() as session:
+async def add_project_asset(
+    project_id: int,
+    asset_type: AssetTypeEnum,
+    telegram_file_id: str | None,
+    text_content: str = None,
+    cache_key: str = None,
+    session: AsyncSession = None
+) -> ProjectAsset:
+    """Добавляет ассет (например, фото, PDF или текст) к проекту."""
+    async with _session_scope(session) as session:
         new_asset = ProjectAsset(
             project_id=project_id,
             asset_type=asset_type,
-            telegram_file_id=telegram_file_id
+            telegram_file_id=telegram_file_id,
+            text_content=text_content,
+            cache_key=cache_key
         )
         session.add(new_asset)
-        await session.commit()
+        await session.flush()
+        await db_cache.invalidate([f"project_card:{project_id}"], session)
+        return new_asset
+
+async def get_asset_by_cache_key(asset_type: AssetTypeEnum, cache_key: str, session: AsyncSession = None) -> ProjectAsset | None:
+    """Возвращает самый свежий ассет с указанным ключом генерации."""
+    async with _session_scope(session) as session:
+        query = (
+            select(ProjectAsset)
+            .where(ProjectAsset.asset_type == asset_type, ProjectAsset.cache_key == cache_key)
+            .order_by(ProjectAsset.created_at.desc())
+            .limit(1)
+        )
+        result = await session.execute(query)
+        return result.scalars().first()
 
-async def get_project_assets(project_id: int) -> list[ProjectAsset]:
+async def get_assets_by_cache_key(asset_type: AssetTypeEnum, cache_key: str, session: AsyncSession = None) -> list[ProjectAsset]:
+    """
+    Возвращает набор ассетов с указанным ключом генерации (например, изображения мудборда).
+    Если набор сохранялся для нескольких проектов, берется самый свежий.
+    """
+    latest = await get_asset_by_cache_key(asset_type, cache_key, session=session)
+    if latest is None:
+        return []
+    async with _session_scope(session) as session:
+        query = (
+            select(ProjectAsset)
+            .where(
+                ProjectAsset.project_id == latest.project_id,
+                ProjectAsset.asset_type == asset_type,
+                ProjectAsset.cache_key == cache_key
+            )
+            .order_by(ProjectAsset.id)
+        )
+        result = await session.execute(query)
+        return list(result.scalars().all())
+
+async def get_latest_project_asset(project_id: int, asset_type: AssetTypeEnum, session: AsyncSession = None) -> ProjectAsset | None:
+    """Возвращает самый свежий ассет проекта указанного типа."""
+    async with _session_scope(session) as session:
+        query = (
+            select(ProjectAsset)
+            .where(ProjectAsset.project_id == project_id, ProjectAsset.asset_type == asset_type)
+            .order_by(ProjectAsset.created_at.desc())
+            .limit(1)
+        )
+        result = await session.execute(query)
+        return result.scalars().first()
+
+async def get_project_assets(project_id: int, session: AsyncSession = None) -> list[ProjectAsset]:
     """Возвращает все ассеты для указанного проекта."""
-    async with async_session_factory() as session:
+    async with _session_scope(session) as session:
         query = select(ProjectAsset).where(ProjectAsset.project_id == project_id)
         result = await session.execute(query)
         return result.scalars().all()
 
 
+async def create_generation_job(
+    chat_id: int,
+    project_id: int,
+    template_id: int,
+    draft_text: str,
+    images: list[dict],
+    profile: str = None,
+    status_message_id: int = None,
+    regenerate: bool = False,
+    session: AsyncSession = None
+) -> GenerationJob:
+    """
+    Создает задачу генерации в статусе 'В очереди'.
+    В сессии апдейта задачу нужно зафиксировать до передачи в очередь: воркер читает ее своей сессией.
+    """
+    async with _session_scope(session) as session:
+        job = GenerationJob(
+            chat_id=chat_id,
+            project_id=project_id,
+            template_id=template_id,
+            draft_text=draft_text,
+            images=images,
+            profile=profile,
+            status_message_id=status_message_id,
+            regenerate=regenerate,
+            status=JobStatusEnum.QUEUED
+        )
+        session.add(job)
+        await session.flush()
+        return job
+
+async def get_generation_job(job_id: int, session: AsyncSession = None) -> GenerationJob | None:
+    """Возвращает задачу генерации по ID."""
+    async with _session_scope(session) as session:
+        return await session.get(GenerationJob, job_id)
+
+async def update_generation_job(job_id: int, session: AsyncSession = None, **fields) -> GenerationJob | None:
+    """Обновляет поля задачи генерации (статус, этап, контрольные данные)."""
+    async with _session_scope(session) as session:
+        job = await session.get(GenerationJob, job_id)
+        if job:
+            for name, value in fields.items():
+                setattr(job, name, value)
+        return job
+
+async def get_unfinished_generation_jobs(session: AsyncSession = None) -> list[GenerationJob]:
+    """Возвращает задачи, которые не были завершены (например, из-за перезапуска)."""
+    async with _session_scope(session) as session:
+        query = (
+            select(GenerationJob)
+            .where(GenerationJob.status.in_([JobStatusEnum.QUEUED, JobStatusEnum.RUNNING]))
+            .order_by(GenerationJob.id)
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+
+async def get_llm_cache_entry(key: str) -> LlmCacheEntry | None:
+    """Возвращает непросроченный ответ LLM из персистентного кэша."""
+    async with async_session_factory() as session:
+        entry = await session.get(LlmCacheEntry, key)
+        if entry and entry.expires_at and entry.expires_at < datetime.datetime.now():
+            return None
+        return entry
+
+async def save_llm_cache_entry(key: str, model: str, response: str, expires_at: datetime.datetime | None):
+    """Сохраняет (или перезаписывает) ответ LLM в персистентном кэше."""
+    async with async_session_factory() as session:
+        await session.merge(LlmCacheEntry(
+            key=key,
+            model=model,
+            response=response,
+            created_at=datetime.datetime.now(),
+            expires_at=expires_at
+        ))
+        await session.commit()
+
+async def prune_llm_cache(max_rows: int) -> int:
+    """
+    Удаляет просроченные записи кэша LLM и самые старые записи сверх лимита.
+
+    :return: Количество удаленных записей.
+    """
+    async with async_session_factory() as session:
+        expired = await session.execute(
+            delete(LlmCacheEntry).where(LlmCacheEntry.expires_at < datetime.datetime.now())
+        )
+        removed = expired.rowcount or 0
+
+        keep = select(LlmCacheEntry.key).order_by(LlmCacheEntry.created_at.desc()).limit(max_rows)
+        overflow = await session.execute(
+            delete(LlmCacheEntry).where(LlmCacheEntry.key.not_in(keep.scalar_subquery()))
+        )
+        removed += overflow.rowcount or 0
+        await session.commit()
+        return removed
+
+
 async def _load_demo_template_if_not_exists():
     """
     Загружает демо-шаблон в базу данных при первом запуске,
@@ -146,8 +458,7 @@ async def _load_demo_template_if_not_exists():
     """
     try:
         # Проверяем, есть ли уже шаблоны
-        templates = await get_all_templates()
-        if templates:
+        if await templates_exist():
             return  # Шаблоны уже есть, не загружаем демо
 
         # Читаем демо-шаблон из файла
@@ -0,0 +1,163 @@
+# file: bot/db/explain_check.py
+"""
+Проверка планов запросов: каждый «горячий» запрос из database.py и планировщика
+должен использовать свой индекс. Работает с SQLite и PostgreSQL.
+
+Запуск (после `alembic upgrade head`):
+    python -m bot.db.explain_check
+"""
+
+import asyncio
+import datetime
+import json
+import sys
+from dataclasses import dataclass
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from .database import engine
+from .models import AssetTypeEnum, GenerationJob, JobStatusEnum, Project, ProjectAsset, StatusEnum
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN поверх произвольного SELECT; параметры запроса передаются как обычно."""
+    inherit_cache = False
+
+    def __init__(self, statement: Select, prefix: str):
+        self.statement = statement
+        self.prefix = prefix
+
+
+@compiles(Explain)
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return f"{element.prefix} {compiler.process(element.statement, **kw)}"
+
+
+@dataclass
+class QueryCheck:
+    name: str
+    statement: Select
+    index: str
+
+
+def hot_queries() -> list[QueryCheck]:
+    """Запросы в той же форме, в какой их строят database.py и scheduler.py."""
+    week_ago = datetime.datetime.now() - datetime.timedelta(days=7)
+    return [
+        QueryCheck(
+            "get_projects_by_status",
+            select(Project).where(Project.status == StatusEnum.IDEA).order_by(Project.created_at.desc()),
+            "ix_projects_status_created_at",
+        ),
+        QueryCheck(
+            "get_project_assets",
+            select(ProjectAsset).where(ProjectAsset.project_id == 1),
+            "ix_project_assets_project_id_type_created_at",
+        ),
+        QueryCheck(
+            "get_project_card",
+            select(Project.id, select(ProjectAsset.telegram_file_id)
+                   .where(ProjectAsset.project_id == Project.id, ProjectAsset.asset_type == AssetTypeEnum.IMAGE_REFERENCE)
+                   .order_by(ProjectAsset.id)
+                   .limit(1)
+                   .scalar_subquery())
+            .where(Project.id == 1),
+            "ix_project_assets_project_id_type_created_at",
+        ),
+        QueryCheck(
+            "get_latest_project_asset",
+            select(ProjectAsset)
+            .where(ProjectAsset.project_id == 1, ProjectAsset.asset_type == AssetTypeEnum.GENERATED_PDF)
+            .order_by(ProjectAsset.created_at.desc())
+            .limit(1),
+            "ix_project_assets_project_id_type_created_at",
+        ),
+        QueryCheck(
+            "get_asset_by_cache_key",
+            select(ProjectAsset)
+            .where(ProjectAsset.asset_type == AssetTypeEnum.GENERATED_PDF, ProjectAsset.cache_key == "0" * 64)
+            .order_by(ProjectAsset.created_at.desc())
+            .limit(1),
+            "ix_project_assets_type_cache_key_created_at",
+        ),
+        QueryCheck(
+            "check_active_projects",
+            select(Project).where(
+                Project.status == StatusEnum.ACTIVE,
+                Project.reminder_interval_days.is_not(None)
+            ),
+            "ix_projects_status_reminder_interval",
+        ),
+        QueryCheck(
+            "weekly_idea_check",
+            select(Project).where(Project.created_at >= week_ago),
+            "ix_projects_created_at",
+        ),
+        QueryCheck(
+            "get_unfinished_generation_jobs",
+            select(GenerationJob)
+            .where(GenerationJob.status.in_([JobStatusEnum.QUEUED, JobStatusEnum.RUNNING]))
+            .order_by(GenerationJob.id),
+            "ix_generation_jobs_status_id",
+        ),
+    ]
+
+
+def _postgres_index_names(plan) -> set[str]:
+    """Собирает имена индексов из JSON-плана PostgreSQL."""
+    names = set()
+    if isinstance(plan, dict):
+        if "Index Name" in plan:
+            names.add(plan["Index Name"])
+        for value in plan.values():
+            names |= _postgres_index_names(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            names |= _postgres_index_names(item)
+    return names
+
+
+async def explain_query(conn, statement: Select) -> tuple[str, set[str]]:
+    """
+    Возвращает текст плана и имена использованных индексов.
+    PostgreSQL на маленьких таблицах предпочитает seq scan, поэтому он на время проверки запрещается:
+    проверяется, что индекс подходит к запросу, а не то, что он выгоднее на текущих данных.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        rows = (await conn.execute(Explain(statement, "EXPLAIN QUERY PLAN"))).all()
+        plan = "\n".join(row[-1] for row in rows)
+        names = {word for line in plan.splitlines() for word in line.split() if word.startswith("ix_")}
+        return plan, names
+
+    if dialect == "postgresql":
+        await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        raw = (await conn.execute(Explain(statement, "EXPLAIN (FORMAT JSON)"))).scalar()
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        return json.dumps(plan, indent=2), _postgres_index_names(plan)
+
+    raise RuntimeError(f"Диалект {dialect} не поддерживается")
+
+
+async def run_checks() -> bool:
+    """Проверяет все запросы и печатает результат. Возвращает True, если все используют свои индексы."""
+    ok = True
+    async with engine.connect() as conn:
+        print(f"Database: {conn.dialect.name}")
+        for check in hot_queries():
+            async with conn.begin():
+                plan, indexes = await explain_query(conn, check.statement)
+            passed = check.index in indexes
+            ok = ok and passed
+            print(f"[{'OK' if passed else 'FAIL'}] {check.name}: expected {check.index}, used {sorted(indexes) or 'no index'}")
+            if not passed:
+                print("    " + plan.replace("\n", "\n    "))
+    await engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    engine.echo = False
+    sys.exit(0 if asyncio.run(run_checks()) else 1)
@@ -4,12 +4,16 @@ import datetime
 from sqlalchemy import (
     create_engine,
     Integer,
+    BigInteger,
     String,
     Text,
     DateTime,
     ForeignKey,
     func,
     Enum,
+    JSON,
+    Boolean,
+    Index,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 import enum
@@ -36,8 +40,32 @@ class AssetTypeEnum(enum.Enum):
     SOCIAL_TEXT = "social_text"
 
 
+class JobStatusEnum(enum.Enum):
+    """Перечисление для статусов задач генерации."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class JobStageEnum(enum.Enum):
+    """Контрольные точки задачи генерации: последний завершенный этап."""
+    CREATED = "created"
+    TEXTS_READY = "texts_ready"
+    PDF_SENT = "pdf_sent"
+    FINISHED = "finished"
+
+
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Списки проектов по статусу (get_projects_by_status): фильтр + сортировка по дате
+        Index("ix_projects_status_created_at", "status", "created_at"),
+        # Напоминания планировщика: активные проекты с заданным интервалом
+        Index("ix_projects_status_reminder_interval", "status", "reminder_interval_days"),
+        # Еженедельная проверка идей: диапазон по дате создания
+        Index("ix_projects_created_at", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(255))
@@ -52,12 +80,20 @@ class Project(Base):
 
 class ProjectAsset(Base):
     __tablename__ = "project_assets"
+    __table_args__ = (
+        # Ассеты проекта (get_project_assets) и последний ассет типа (get_latest_project_asset)
+        Index("ix_project_assets_project_id_type_created_at", "project_id", "asset_type", "created_at"),
+        # Поиск готовых результатов генерации по ключу (get_asset_by_cache_key)
+        Index("ix_project_assets_type_cache_key_created_at", "asset_type", "cache_key", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
     asset_type: Mapped[AssetTypeEnum] = mapped_column(Enum(AssetTypeEnum))
-    telegram_file_id: Mapped[str] = mapped_column(String(255))
+    telegram_file_id: Mapped[str] = mapped_column(String(255), nullable=True)
     text_content: Mapped[str] = mapped_column(Text, nullable=True)
+    # Хэш входных данных генерации (для GENERATED_PDF / SOCIAL_TEXT)
+    cache_key: Mapped[str] = mapped_column(String(64), nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=func.now())
     
     project: Mapped["Project"] = relationship(back_populates="assets")
@@ -70,4 +106,54 @@ class PdfTemplate(Base):
     name: Mapped[str] = mapped_column(String(100), unique=True)
     html_template: Mapped[str] = mapped_column(Text)
     css_template: Mapped[str] = mapped_column(Text, nullable=True)
-    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=func.now())
\ No newline at end of file
+    # SHA-256 от HTML + CSS: списки шаблонов показывают его, не загружая тела шаблонов
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=func.now())
+
+
+class GenerationJob(Base):
+    """Задача генерации контента. Хранит входные данные и контрольные точки, чтобы пережить перезапуск."""
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        # Незавершенные задачи при старте бота (get_unfinished_generation_jobs)
+        Index("ix_generation_jobs_status_id", "status", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    status_message_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
+    template_id: Mapped[int] = mapped_column(ForeignKey("pdf_templates.id", ondelete="CASCADE"))
+    profile: Mapped[str] = mapped_column(String(20), nullable=True)
+    draft_text: Mapped[str] = mapped_column(Text)
+    # [{"file_id": ..., "hash": ...}] — изображения можно заново скачать из Telegram по file_id
+    images: Mapped[list] = mapped_column(JSON, default=list)
+
+    status: Mapped[JobStatusEnum] = mapped_column(Enum(JobStatusEnum), default=JobStatusEnum.QUEUED)
+    stage: Mapped[JobStageEnum] = mapped_column(Enum(JobStageEnum), default=JobStageEnum.CREATED)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    card_text: Mapped[str] = mapped_column(Text, nullable=True)
+    social_text: Mapped[str] = mapped_column(Text, nullable=True)
+    social_sent: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Перегенерация: не брать результаты из кэшей
+    regenerate: Mapped[bool] = mapped_column(Boolean, default=False)
+    pdf_file_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class LlmCacheEntry(Base):
+    """Второй (персистентный) уровень кэша ответов LLM."""
+    __tablename__ = "llm_response_cache"
+    __table_args__ = (
+        # Очистка кэша: просроченные и самые старые записи
+        Index("ix_llm_response_cache_expires_at", "expires_at"),
+        Index("ix_llm_response_cache_created_at", "created_at"),
+    )
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(255))
+    response: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=func.now())
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)
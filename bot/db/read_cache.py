@@ -0,0 +1,174 @@
+# file: bot/db/read_cache.py
+
+import datetime
+import enum
+import json
+from typing import Any, Awaitable, Callable, Protocol
+
+from sqlalchemy import DateTime, Enum, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from bot.config import settings
+from bot.services.cache import CacheStats, LRUCache
+
+# Ключи, сброшенные в еще не завершенной сессии апдейта
+_PENDING_KEYS = "db_cache_pending_keys"
+
+
+class CacheBackend(Protocol):
+    """
+    Хранилище кэша чтений. Значения — JSON-строки, поэтому хранилище в памяти процесса
+    можно заменить общим (например, Redis), когда бот запущен в нескольких репликах.
+    """
+
+    async def get(self, key: str) -> str | None: ...
+
+    async def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    async def delete(self, keys: list[str]) -> None: ...
+
+
+class MemoryCacheBackend:
+    """Хранилище в памяти процесса на основе LRUCache."""
+
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> str | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._cache.set(key, value, ttl=ttl)
+
+    async def delete(self, keys: list[str]) -> None:
+        for key in keys:
+            self._cache.pop(key)
+
+
+def to_snapshot(obj) -> dict:
+    """Снимок загруженных колонок ORM-объекта в виде JSON-совместимого словаря."""
+    state = inspect(obj)
+    data = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key not in state.dict:
+            continue
+        value = state.dict[attr.key]
+        if isinstance(value, enum.Enum):
+            value = value.name
+        elif isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        data[attr.key] = value
+    return data
+
+
+def from_snapshot(model: type, data: dict):
+    """
+    Восстанавливает объект модели из снимка в состоянии detached: его нельзя
+    изменить через сессию, а обращение к связям вызывает ошибку, а не запрос к БД.
+    """
+    values = {}
+    for attr in inspect(model).column_attrs:
+        if attr.key not in data:
+            continue
+        value = data[attr.key]
+        column_type = attr.columns[0].type
+        if value is not None and isinstance(column_type, Enum) and column_type.enum_class:
+            value = column_type.enum_class[value]
+        elif value is not None and isinstance(column_type, DateTime):
+            value = datetime.datetime.fromisoformat(value)
+        values[attr.key] = value
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return obj
+
+
+class ReadThroughCache:
+    """
+    Кэш чтений перед функциями database.py: промах загружает данные из БД и сохраняет снимок.
+    Функции записи сбрасывают затронутые ключи. Если в сессии апдейта уже были записи,
+    чтения в ней идут мимо кэша до конца апдейта, чтобы незафиксированные данные не попали в кэш.
+
+    Каждый сброс ключа увеличивает его поколение. Промах сохраняет загруженное значение, только если
+    поколение за время загрузки не изменилось: иначе запись, зафиксированная во время загрузки,
+    была бы перезаписана старыми данными. Поколения ведутся в памяти процесса.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = CacheStats()
+        # Чтения мимо кэша из-за записей в той же сессии
+        self.bypassed = 0
+        # Загрузки, не сохраненные в кэш: ключ сбросили, пока шла загрузка
+        self.stale_loads = 0
+        self._generations: dict[str, int] = {}
+
+    async def get_or_load(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Any]],
+        dump: Callable[[Any], Any],
+        restore: Callable[[Any], Any],
+        session: AsyncSession | None = None
+    ) -> Any:
+        """
+        Возвращает значение из кэша или загружает его.
+        None не кэшируется: отсутствующая запись может появиться в любой момент.
+        """
+        if not self.enabled:
+            return await load()
+        if session is not None and session.info.get(_PENDING_KEYS):
+            self.bypassed += 1
+            return await load()
+
+        raw = await self.backend.get(key)
+        if raw is not None:
+            self.stats.hits += 1
+            return restore(json.loads(raw))
+
+        self.stats.misses += 1
+        generation = self._generations.get(key, 0)
+        value = await load()
+        if value is None:
+            return value
+        if self._generations.get(key, 0) != generation:
+            self.stale_loads += 1
+            return value
+        await self.backend.set(key, json.dumps(dump(value)), self.ttl)
+        return value
+
+    async def invalidate(self, keys: list[str], session: AsyncSession | None = None):
+        """
+        Сбрасывает ключи. В сессии апдейта они сбрасываются повторно после ее завершения:
+        до коммита другие сессии еще видят старые данные и могут снова их закэшировать.
+        """
+        self._bump(keys)
+        await self.backend.delete(keys)
+        self.stats.invalidations += len(keys)
+        if session is not None:
+            session.info.setdefault(_PENDING_KEYS, set()).update(keys)
+
+    async def finish_session(self, session: AsyncSession):
+        """Вызывается после коммита или отката сессии апдейта."""
+        keys = session.info.pop(_PENDING_KEYS, None)
+        if keys:
+            keys = list(keys)
+            self._bump(keys)
+            await self.backend.delete(keys)
+
+    def _bump(self, keys: list[str]):
+        for key in keys:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {**self.stats.as_dict(), "bypassed": self.bypassed, "stale_loads": self.stale_loads}
+
+
+# Глобальный кэш чтений из БД
+db_cache = ReadThroughCache(
+    MemoryCacheBackend(maxsize=settings.db_cache_size),
+    ttl=settings.db_cache_ttl,
+    enabled=settings.db_cache_enabled
+)
@@ -4,5 +4,10 @@ from aiogram.fsm.state import State, StatesGroup
 class GenerateContent(StatesGroup):
     waiting_for_project_choice = State()
     waiting_for_template_choice = State()
+    waiting_for_profile_choice = State()
     waiting_for_images = State()
-    waiting_for_draft_text = State()
\ No newline at end of file
+    waiting_for_draft_text = State()
+
+class BuildPortfolio(StatesGroup):
+    waiting_for_template_choice = State()
+    waiting_for_profile_choice = State()
\ No newline at end of file
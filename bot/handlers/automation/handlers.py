@@ -1,33 +1,35 @@
 # file: bot/handlers/automation/handlers.py
 
-import os
-import uuid
-import asyncio
 from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, ContentType, BufferedInputFile
 from aiogram.utils.media_group import MediaGroupBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.db.database import (
     get_projects_by_status, 
-    get_all_templates, 
-    get_project_by_id, 
-    get_template_by_id
+    get_template_summaries,
+    get_template_by_id,
+    get_generation_job,
+    create_generation_job,
+    update_generation_job
 )
-from bot.db.models import StatusEnum
-from bot.services.pdf_generator import create_project_card_pdf
-from bot.services.llm_service import generate_text_from_draft, PDF_CARD_PROMPT, SOCIAL_MEDIA_PROMPT
-from .fsm import GenerateContent
-from .keyboards import get_project_choice_keyboard, get_template_choice_keyboard
+from bot.db.models import StatusEnum, JobStatusEnum
+from bot.services.pdf_profiles import get_pdf_profile
+from bot.services.image_store import image_store, download_telegram_file
+from bot.services.portfolio import TELEGRAM_UPLOAD_LIMIT, build_portfolio
+from bot.services.progress import StatusMessage
+from bot.services.generation import generation_queue
+from bot.services.job_queue import QueueFullError
+from .fsm import GenerateContent, BuildPortfolio
+from .keyboards import get_project_choice_keyboard, get_template_choice_keyboard, get_profile_choice_keyboard
 
 router = Router()
 
-TEMP_IMAGES_DIR = "temp_images"
-
 @router.callback_query(F.data == "generate_content")
-async def generate_content_start(callback: CallbackQuery, state: FSMContext):
-    archived_projects = await get_projects_by_status(StatusEnum.ARCHIVED)
+async def generate_content_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    archived_projects = await get_projects_by_status(StatusEnum.ARCHIVED, session=session)
     await callback.answer()
     await callback.message.edit_text(
         "📄 <b>Генератор контента</b>\n\nВыберите завершенный проект, для которого нужно создать материалы.",
@@ -37,11 +39,11 @@ async def generate_content_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(GenerateContent.waiting_for_project_choice)
 
 @router.callback_query(GenerateContent.waiting_for_project_choice, F.data.startswith("gen_project_"))
-async def process_project_choice(callback: CallbackQuery, state: FSMContext):
+async def process_project_choice(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     project_id = int(callback.data.split("_")[2])
     await state.update_data(project_id=project_id)
     
-    templates = await get_all_templates()
+    templates = await get_template_summaries(session=session)
     if not templates:
         await callback.answer("❌ У вас нет ни одного шаблона PDF! Сначала добавьте его в 'Управлении шаблонами'.", show_alert=True)
         return
@@ -58,68 +60,172 @@ async def process_template_choice(callback: CallbackQuery, state: FSMContext):
     template_id = int(callback.data.split("_")[2])
     await state.update_data(template_id=template_id)
     await callback.answer()
+    await callback.message.edit_text(
+        "Шаблон выбран. Какое качество PDF нужно?\n\n"
+        "<i>Черновик — быстро и легко, для печати — медленнее и тяжелее.</i>",
+        reply_markup=get_profile_choice_keyboard(),
+        parse_mode=ParseMode.HTML
+    )
+    await state.set_state(GenerateContent.waiting_for_profile_choice)
+
+@router.callback_query(GenerateContent.waiting_for_profile_choice, F.data.startswith("gen_profile_"))
+async def process_profile_choice(callback: CallbackQuery, state: FSMContext):
+    profile_name = callback.data.removeprefix("gen_profile_")
+    await state.update_data(profile=get_pdf_profile(profile_name).name)
+    await callback.answer()
     await callback.message.edit_text("Отлично! Теперь отправьте мне финальные рендеры проекта (до 5 штук). Можно отправить группой.")
     await state.set_state(GenerateContent.waiting_for_images)
 
 @router.message(GenerateContent.waiting_for_images, F.photo)
 async def process_images(message: Message, state: FSMContext):
-    os.makedirs(TEMP_IMAGES_DIR, exist_ok=True)
-    file = await message.bot.get_file(message.photo[-1].file_id)
-    file_name = f"{uuid.uuid4()}.jpg"
-    destination = os.path.join(TEMP_IMAGES_DIR, file_name)
-    await message.bot.download_file(file.file_path, destination)
+    file_id = message.photo[-1].file_id
+    image_hash = image_store.put(await download_telegram_file(message.bot, file_id))
     
     data = await state.get_data()
-    image_paths = data.get("image_paths", [])
-    image_paths.append(destination)
-    await state.update_data(image_paths=image_paths)
+    images = data.get("images", [])
+    images.append({"file_id": file_id, "hash": image_hash})
+    await state.update_data(images=images)
 
-    await message.answer(f"Принято фото <b>{len(image_paths)}/5</b>. Когда закончите, отправьте мне дополняющий текст о деталях реализации проекта.", parse_mode=ParseMode.HTML)
+    await message.answer(f"Принято фото <b>{len(images)}/5</b>. Когда закончите, отправьте мне дополняющий текст о деталях реализации проекта.", parse_mode=ParseMode.HTML)
     await state.set_state(GenerateContent.waiting_for_draft_text)
 
 @router.message(GenerateContent.waiting_for_draft_text, F.text)
-async def process_draft_text_and_generate(message: Message, state: FSMContext):
-    await message.answer("<i>Принял! Начинаю генерацию... Это может занять до минуты.</i>", parse_mode=ParseMode.HTML)
+async def process_draft_text_and_generate(message: Message, state: FSMContext, session: AsyncSession):
+    status = await StatusMessage.send(message, "<i>Принял! Ставлю генерацию в очередь...</i>")
     
     user_data = await state.get_data()
-    final_draft = message.text
-    
-    project = await get_project_by_id(user_data.get("project_id"))
-    template = await get_template_by_id(user_data.get("template_id"))
-    
-    initial_description = project.description
-    full_draft = f"Initial Idea: {initial_description}\n\nImplementation Details: {final_draft}"
+    await state.clear()
+
+    # Задача сохраняется в БД, чтобы пережить перезапуск бота
+    job = await create_generation_job(
+        chat_id=message.chat.id,
+        project_id=user_data.get("project_id"),
+        template_id=user_data.get("template_id"),
+        draft_text=message.text,
+        images=user_data.get("images", []),
+        profile=user_data.get("profile"),
+        status_message_id=status.message_id,
+        session=session
+    )
+    # Воркер очереди читает задачу своей сессией
+    await session.commit()
     
     try:
-        pdf_text_task = asyncio.create_task(generate_text_from_draft(PDF_CARD_PROMPT, full_draft))
-        social_text_task = asyncio.create_task(generate_text_from_draft(SOCIAL_MEDIA_PROMPT, full_draft))
-        pdf_text_result, social_text_result = await asyncio.gather(pdf_text_task, social_text_task)
-        
-        if not pdf_text_result or not social_text_result:
-            raise ValueError("Одна или обе LLM задачи вернули ошибку.")
-
-        await message.answer("Тексты сгенерированы. Создаю PDF-файл...")
-        
-        pdf_bytes = await create_project_card_pdf(
-            project_name=project.name,
-            project_description=pdf_text_result,
-            images_paths=user_data.get("image_paths", []),
-            html_template_str=template.html_template,
-            css_template_str=template.css_template
+        await generation_queue.submit(job.id, status)
+    except QueueFullError:
+        await update_generation_job(job.id, session=session, status=JobStatusEnum.FAILED, error="Очередь заполнена")
+        image_store.discard([image["hash"] for image in job.images])
+        await status.update(
+            "❌ <b>Сейчас слишком много задач в очереди.</b> Попробуйте чуть позже.",
+            force=True
         )
-        
-        pdf_file = BufferedInputFile(pdf_bytes, filename=f"{project.name.replace(' ', '_')}_Card.pdf")
-        await message.answer_document(pdf_file, caption="✅ Готово! Ваша презентационная карточка.")
-        
-        await message.answer(
-            f"Текст для социальных сетей:\n<pre>{social_text_result}</pre>",
-            parse_mode=ParseMode.HTML
+
+
+@router.callback_query(F.data.startswith("regenerate_job_"))
+async def regenerate_job(callback: CallbackQuery, session: AsyncSession):
+    """Повторяет генерацию с теми же входными данными, но с новыми ответами LLM."""
+    job_id = int(callback.data.split("_")[2])
+    source_job = await get_generation_job(job_id, session=session)
+    if source_job is None:
+        await callback.answer("❌ Исходная задача не найдена.", show_alert=True)
+        return
+
+    await callback.answer()
+    status = await StatusMessage.send(callback.message, "<i>🔄 Ставлю повторную генерацию в очередь...</i>")
+    job = await create_generation_job(
+        chat_id=source_job.chat_id,
+        project_id=source_job.project_id,
+        template_id=source_job.template_id,
+        draft_text=source_job.draft_text,
+        images=source_job.images,
+        profile=source_job.profile,
+        status_message_id=status.message_id,
+        regenerate=True,
+        session=session
+    )
+    await session.commit()
+
+    try:
+        await generation_queue.submit(job.id, status)
+    except QueueFullError:
+        await update_generation_job(job.id, session=session, status=JobStatusEnum.FAILED, error="Очередь заполнена")
+        await status.update(
+            "❌ <b>Сейчас слишком много задач в очереди.</b> Попробуйте чуть позже.",
+            force=True
+        )
+
+
+# --- СБОРКА ПОРТФОЛИО ---
+
+@router.callback_query(F.data == "build_portfolio")
+async def build_portfolio_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    archived_projects = await get_projects_by_status(StatusEnum.ARCHIVED, session=session)
+    if not archived_projects:
+        await callback.answer("🗄 В архиве пока нет проектов.", show_alert=True)
+        return
+
+    templates = await get_template_summaries(session=session)
+    if not templates:
+        await callback.answer("❌ У вас нет ни одного шаблона PDF! Сначала добавьте его в 'Управлении шаблонами'.", show_alert=True)
+        return
+
+    await callback.answer()
+    await callback.message.edit_text(
+        f"📚 <b>Портфолио</b>\n\nВ него войдут все проекты из архива: <b>{len(archived_projects)}</b>. "
+        "Выберите шаблон для карточек.",
+        reply_markup=get_template_choice_keyboard(templates, callback_prefix="portfolio_template_"),
+        parse_mode=ParseMode.HTML
+    )
+    await state.set_state(BuildPortfolio.waiting_for_template_choice)
+
+@router.callback_query(BuildPortfolio.waiting_for_template_choice, F.data.startswith("portfolio_template_"))
+async def process_portfolio_template_choice(callback: CallbackQuery, state: FSMContext):
+    template_id = int(callback.data.split("_")[2])
+    await state.update_data(template_id=template_id)
+    await callback.answer()
+    await callback.message.edit_text(
+        "Шаблон выбран. Какое качество PDF нужно?",
+        reply_markup=get_profile_choice_keyboard(callback_prefix="portfolio_profile_")
+    )
+    await state.set_state(BuildPortfolio.waiting_for_profile_choice)
+
+@router.callback_query(BuildPortfolio.waiting_for_profile_choice, F.data.startswith("portfolio_profile_"))
+async def process_portfolio_profile_choice(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await callback.answer()
+    profile = get_pdf_profile(callback.data.removeprefix("portfolio_profile_"))
+    user_data = await state.get_data()
+    await state.clear()
+
+    projects = await get_projects_by_status(StatusEnum.ARCHIVED, session=session)
+    template = await get_template_by_id(user_data.get("template_id"), session=session)
+    # Сборка долгая и пишет ассеты своими сессиями — не держим транзакцию апдейта открытой
+    await session.commit()
+
+    status = StatusMessage(callback.message)
+    await status.update(f"<i>Собираю портфолио: 0/{len(projects)}...</i>", force=True)
+
+    async def on_progress(done: int, total: int):
+        await status.update(f"<i>Собираю портфолио: {done}/{total}...</i>", force=done == total)
+
+    try:
+        portfolio_pdf, cards = await build_portfolio(callback.bot, projects, template, profile, on_progress)
+        failed = [card for card in cards if card.error]
+        caption = f"✅ Портфолио готово! Проектов: {len(cards) - len(failed)}."
+        if failed:
+            failed_names = ", ".join(card.project.name for card in failed)
+            caption += f"\n⚠️ Не удалось собрать: {failed_names}"
+        if len(portfolio_pdf) > TELEGRAM_UPLOAD_LIMIT:
+            await status.update(
+                f"❌ <b>Портфолио получилось слишком большим:</b> {len(portfolio_pdf) / 1024 / 1024:.1f} МБ "
+                f"при лимите Telegram {TELEGRAM_UPLOAD_LIMIT // 1024 // 1024} МБ.\n\n"
+                "<i>Попробуйте профиль «Черновик» или уменьшите число проектов в архиве.</i>",
+                force=True
+            )
+            return
+        await status.update("<i>Портфолио собрано, отправляю...</i>", force=True)
+        await callback.message.answer_document(
+            BufferedInputFile(portfolio_pdf, filename="Portfolio.pdf"),
+            caption=caption[:1024]
         )
-        
     except Exception as e:
-        await message.answer(f"❌ <b>Произошла серьезная ошибка во время генерации:</b> {e}", parse_mode=ParseMode.HTML)
-    finally:
-        for path in user_data.get("image_paths", []):
-            if os.path.exists(path):
-                os.remove(path)
-        await state.clear()
\ No newline at end of file
+        await callback.message.answer(f"❌ <b>Не удалось собрать портфолио:</b> {e}", parse_mode=ParseMode.HTML)
\ No newline at end of file
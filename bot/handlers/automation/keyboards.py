@@ -1,6 +1,8 @@
 # file: bot/handlers/automation/keyboards.py
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
-from bot.db.models import Project, PdfTemplate
+from bot.db.database import TemplateSummary
+from bot.db.models import Project
+from bot.services.pdf_profiles import PDF_PROFILES, get_pdf_profile
 
 def get_project_choice_keyboard(projects: list[Project]):
     """Создает клавиатуру для выбора проекта из списка."""
@@ -12,10 +14,27 @@ def get_project_choice_keyboard(projects: list[Project]):
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="automations"))
     return builder.as_markup()
     
-def get_template_choice_keyboard(templates: list[PdfTemplate]):
+def get_template_choice_keyboard(templates: list[TemplateSummary], callback_prefix: str = "gen_template_"):
     """Создает клавиатуру для выбора шаблона PDF."""
     builder = InlineKeyboardBuilder()
     for template in templates:
-        builder.row(InlineKeyboardButton(text=f"🎨 {template.name}", callback_data=f"gen_template_{template.id}"))
+        builder.row(InlineKeyboardButton(text=f"🎨 {template.name}", callback_data=f"{callback_prefix}{template.id}"))
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="automations")) # Пока ведет в общее меню
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+def get_profile_choice_keyboard(callback_prefix: str = "gen_profile_"):
+    """Создает клавиатуру для выбора профиля вывода PDF."""
+    default_profile = get_pdf_profile()
+    builder = InlineKeyboardBuilder()
+    for profile in PDF_PROFILES.values():
+        mark = " (по умолчанию)" if profile.name == default_profile.name else ""
+        builder.row(InlineKeyboardButton(text=f"{profile.title}{mark}", callback_data=f"{callback_prefix}{profile.name}"))
+    builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="automations"))
+    return builder.as_markup()
+
+
+def get_regenerate_keyboard(job_id: int):
+    """Кнопка повторной генерации карточки мимо кэшей."""
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(text="🔄 Сгенерировать заново", callback_data=f"regenerate_job_{job_id}"))
+    return builder.as_markup()
@@ -3,11 +3,18 @@
 from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 
 from .project_manager.keyboards import get_project_manager_keyboard
 from .template_manager.keyboards import get_automations_menu_keyboard
+from bot.db.read_cache import db_cache
+from bot.services.pdf_generator import get_template_cache_stats
+from bot.services.generation import generation_queue
+from bot.services.http_client import llm_http_client
+from bot.services.llm_cache import llm_cache
+from bot.services.llm_service import llm_stats, get_circuit_states
+from bot.services.rate_limiter import ai_rate_limiter
 
 router = Router()
 
@@ -36,6 +43,72 @@ async def cmd_start(message: Message):
     await message.answer(welcome_text, reply_markup=get_main_menu_keyboard(), parse_mode=ParseMode.HTML)
 
 
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    template_stats = get_template_cache_stats()
+    queue_stats = generation_queue.metrics.as_dict()
+    http_stats = llm_http_client.stats.as_dict()
+    llm_cache_stats = llm_cache.stats.as_dict()
+    db_cache_stats = db_cache.as_dict()
+    llm_request_stats = llm_stats.as_dict()
+    open_circuits = [model for model, state in get_circuit_states().items() if state != "closed"]
+    rate_limit_lines = []
+    for name, limits in ai_rate_limiter.as_dict().items():
+        remaining = "∞" if limits["remaining_requests"] is None else limits["remaining_requests"]
+        rate_limit_lines.append(
+            f"<code>{name}</code>: осталось <code>{remaining}</code> запр./мин, "
+            f"ждут: <code>{limits['waiting']}</code>, "
+            f"ожидание: <code>{limits['avg_wait']:.1f} с</code>"
+        )
+    rate_limits_text = "\n".join(rate_limit_lines) or "Запросов еще не было"
+    stats_text = (
+        "📊 <b>Статистика</b>\n\n"
+        "<b>Кэш шаблонов PDF:</b>\n"
+        f"Попадания: <code>{template_stats['hits']}</code>, "
+        f"промахи: <code>{template_stats['misses']}</code>, "
+        f"hit rate: <code>{template_stats['hit_rate']:.0%}</code>\n\n"
+        "<b>Очередь генерации:</b>\n"
+        f"В очереди: <code>{generation_queue.depth}</code>, "
+        f"выполняется: <code>{generation_queue.running}</code>\n"
+        f"Принято: <code>{queue_stats['submitted']}</code>, "
+        f"отклонено: <code>{queue_stats['rejected']}</code>, "
+        f"ошибок: <code>{queue_stats['failed']}</code>\n"
+        f"Ожидание: среднее <code>{queue_stats['avg_wait']:.1f} с</code>, "
+        f"макс. <code>{queue_stats['max_wait']:.1f} с</code>\n\n"
+        "<b>Запросы к LLM:</b>\n"
+        f"Всего: <code>{llm_request_stats['requests']}</code>, "
+        f"ошибок: <code>{llm_request_stats['failed']}</code>\n"
+        f"Длительность: <code>{llm_request_stats['avg_duration']:.1f} с</code>, "
+        f"первый токен: <code>{llm_request_stats['avg_ttft']:.2f} с</code>, "
+        f"скорость: <code>{llm_request_stats['avg_tokens_per_second']:.1f} ток/с</code>\n"
+        f"Повторы: <code>{llm_request_stats['retries']}</code>, "
+        f"дубли: <code>{llm_request_stats['hedged']}</code>, "
+        f"запасные модели: <code>{llm_request_stats['fallbacks']}</code>\n"
+        f"Отключены: <code>{', '.join(open_circuits) or 'нет'}</code>\n\n"
+        "<b>Соединения с LLM:</b>\n"
+        f"Запросы: <code>{http_stats['requests']}</code>, "
+        f"новые соединения: <code>{http_stats['tcp_connects']}</code>, "
+        f"TLS-рукопожатия: <code>{http_stats['tls_handshakes']}</code>, "
+        f"переиспользовано: <code>{http_stats['reused']}</code>\n\n"
+        "<b>Квоты AI-сервисов:</b>\n"
+        f"{rate_limits_text}\n\n"
+        "<b>Кэш ответов LLM:</b>\n"
+        f"Из памяти: <code>{llm_cache_stats['memory_hits']}</code>, "
+        f"из БД: <code>{llm_cache_stats['db_hits']}</code>, "
+        f"промахи: <code>{llm_cache_stats['misses']}</code>, "
+        f"hit rate: <code>{llm_cache_stats['hit_rate']:.0%}</code>\n"
+        f"Перегенерации: <code>{llm_cache_stats['bypassed']}</code>\n\n"
+        "<b>Кэш чтений БД:</b>\n"
+        f"Попадания: <code>{db_cache_stats['hits']}</code>, "
+        f"промахи: <code>{db_cache_stats['misses']}</code>, "
+        f"hit rate: <code>{db_cache_stats['hit_rate']:.0%}</code>\n"
+        f"Сбросы: <code>{db_cache_stats['invalidations']}</code>, "
+        f"в обход (после записи): <code>{db_cache_stats['bypassed']}</code>, "
+        f"устаревшие загрузки: <code>{db_cache_stats['stale_loads']}</code>"
+    )
+    await message.answer(stats_text, parse_mode=ParseMode.HTML)
+
+
 @router.callback_query(F.data == "back_to_main")
 async def back_to_main_menu(callback: CallbackQuery):
     await callback.answer()
@@ -5,8 +5,8 @@ from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, ContentType
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
-from aiogram.utils.media_group import MediaGroupBuilder
 from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Импортируем FSM, клавиатуры, модели, сервисы и функции БД
 from .fsm import AddProjectIdea, ActivateProject, EditProject
@@ -24,13 +24,14 @@ from bot.db.database import (
     update_project_after_creation, 
     get_projects_by_status,
     get_project_by_id,
+    get_project_card,
     update_project_status,
     delete_project,
     update_project_details,
     add_project_asset,
     get_project_assets
 )
-from bot.services.fal_service import generate_moodboard
+from bot.services.moodboard import moodboard_tasks, send_saved_moodboard
 
 
 router = Router()
@@ -39,34 +40,36 @@ router = Router()
 # --- Вспомогательная функция для показа карточки проекта ---
 # =============================================================================
 
-async def _show_project_card(message: Message, project_id: int):
+async def _show_project_card(message: Message, project_id: int, session: AsyncSession = None):
     """
     Вспомогательная функция, которая формирует и отправляет "карточку проекта".
     Использует HTML-форматирование и отображает фото.
     """
-    project = await get_project_by_id(project_id)
-    if not project:
+    card = await get_project_card(project_id, session=session)
+    if not card:
         await message.edit_text("Проект не найден.", reply_markup=get_project_manager_keyboard())
         return
-            
-    assets = await get_project_assets(project.id)
-    reference_image = next((asset for asset in assets if asset.asset_type == AssetTypeEnum.IMAGE_REFERENCE), None)
+
+    project = card.project
+    moodboard_pending = moodboard_tasks.is_running(project.id)
 
     card_text = (
         f"<b>Проект: {project.name}</b>\n\n"
         f"Статус: <code>{project.status.value}</code>\n\n"
         f"<b>Описание:</b>\n<i>{project.description}</i>"
     )
+    if moodboard_pending:
+        card_text += "\n\n⏳ <i>Мудборд генерируется...</i>"
 
-    keyboard = get_project_card_keyboard(project.id, project.status.value)
+    keyboard = get_project_card_keyboard(project.id, project.status.value, card.has_moodboard, moodboard_pending)
 
-    if reference_image:
+    if card.cover_file_id:
         try:
             await message.delete()
         except Exception:
             pass
         await message.answer_photo(
-            photo=reference_image.telegram_file_id,
+            photo=card.cover_file_id,
             caption=card_text,
             reply_markup=keyboard,
             parse_mode=ParseMode.HTML
@@ -132,38 +135,41 @@ async def skip_project_photo(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AddProjectIdea.waiting_for_moodboard_choice)
 
 @router.callback_query(AddProjectIdea.waiting_for_moodboard_choice, F.data.startswith("moodboard_"))
-async def process_moodboard_choice_and_finish(callback: CallbackQuery, state: FSMContext):
+async def process_moodboard_choice_and_finish(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     await callback.answer()
-    
-    if callback.data == "moodboard_yes":
-        await callback.message.edit_text("Генерирую мудборд... Это может занять до минуты.")
-        user_data = await state.get_data()
-        image_urls = await generate_moodboard(user_data.get("description"))
-        
-        if image_urls:
-            media_group = MediaGroupBuilder(caption="Вот несколько визуальных идей:")
-            for url in image_urls:
-                media_group.add(type="photo", media=url)
-            await callback.message.answer_media_group(media=media_group.build())
-        else:
-            await callback.message.answer("Не удалось сгенерировать мудборд.")
 
     user_data = await state.get_data()
     project_name = user_data.get("project_name")
     description = user_data.get("description")
     photo_file_id = user_data.get("photo_file_id")
 
-    new_project = await create_project_idea(name=project_name, description=description)
+    # Проект создается до мудборда: изображения мудборда сохраняются как его ассеты
+    new_project = await create_project_idea(name=project_name, description=description, session=session)
     
     if photo_file_id:
         await add_project_asset(
             project_id=new_project.id,
             asset_type=AssetTypeEnum.IMAGE_REFERENCE,
-            telegram_file_id=photo_file_id
+            telegram_file_id=photo_file_id,
+            session=session
         )
+    # Фоновая генерация мудборда пишет ассеты своей сессией — проект должен быть уже зафиксирован
+    await session.commit()
 
     text_after_creation = f"✅ Идея '<b>{project_name}</b>' сохранена!"
 
+    if callback.data in ("moodboard_yes", "moodboard_collage"):
+        # Мудборд генерируется в фоне и придет отдельным сообщением — ждать его не нужно
+        moodboard_tasks.start(
+            callback.bot,
+            callback.message.chat.id,
+            new_project.id,
+            project_name,
+            description,
+            collage=callback.data == "moodboard_collage"
+        )
+        text_after_creation += "\n\n⏳ <i>Мудборд генерируется и придет отдельным сообщением (до минуты).</i>"
+
     await callback.message.edit_text(
         text_after_creation,
         parse_mode=ParseMode.HTML,
@@ -196,15 +202,15 @@ async def activate_project_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(ActivateProject.waiting_for_reminder)
 
 @router.callback_query(ActivateProject.waiting_for_reminder, F.data.startswith("remind_"))
-async def process_activation_reminder(callback: CallbackQuery, state: FSMContext):
+async def process_activation_reminder(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     await callback.answer()
     interval = int(callback.data.split("_")[1])
     user_data = await state.get_data()
     project_id = user_data.get("project_id")
 
-    project = await update_project_status(project_id, StatusEnum.ACTIVE)
+    project = await update_project_status(project_id, StatusEnum.ACTIVE, session=session)
     if project:
-        await update_project_after_creation(project.id, interval)
+        await update_project_after_creation(project.id, interval, session=session)
     
     await callback.message.edit_text(
         "✅ Проект <b>активирован</b> и взят в работу!", 
@@ -219,14 +225,14 @@ async def process_activation_reminder(callback: CallbackQuery, state: FSMContext
 # =============================================================================
 
 @router.callback_query(F.data.in_({"list_idea_projects", "list_active_projects", "list_archived_projects"}))
-async def list_projects_by_status_handler(callback: CallbackQuery):
+async def list_projects_by_status_handler(callback: CallbackQuery, session: AsyncSession):
     status_map = {
         "list_idea_projects": (StatusEnum.IDEA, "💡 Список идей"),
         "list_active_projects": (StatusEnum.ACTIVE, "⚡️ Активные проекты"),
         "list_archived_projects": (StatusEnum.ARCHIVED, "🗄 Архив")
     }
     status_enum, title = status_map[callback.data]
-    projects = await get_projects_by_status(status_enum)
+    projects = await get_projects_by_status(status_enum, session=session)
     await callback.answer()
 
     list_builder = InlineKeyboardBuilder()
@@ -245,10 +251,28 @@ async def list_projects_by_status_handler(callback: CallbackQuery):
         await callback.message.answer(text, reply_markup=list_builder.as_markup(), parse_mode=ParseMode.HTML)
 
 @router.callback_query(F.data.startswith("show_project_"))
-async def show_project_card_handler_callback(callback: CallbackQuery):
+async def show_project_card_handler_callback(callback: CallbackQuery, session: AsyncSession):
+    project_id = int(callback.data.split("_")[2])
+    await callback.answer()
+    await _show_project_card(callback.message, project_id, session)
+
+@router.callback_query(F.data.startswith("cancel_moodboard_"))
+async def cancel_moodboard_handler(callback: CallbackQuery, session: AsyncSession):
     project_id = int(callback.data.split("_")[2])
+    if await moodboard_tasks.cancel(project_id):
+        await callback.answer("⛔️ Генерация мудборда отменена.", show_alert=True)
+    else:
+        await callback.answer("Мудборд уже готов или не генерировался.", show_alert=True)
+    await _show_project_card(callback.message, project_id, session)
+
+@router.callback_query(F.data.startswith("show_moodboard_"))
+async def show_moodboard_handler(callback: CallbackQuery, session: AsyncSession):
+    project_id = int(callback.data.split("_")[2])
+    assets = await get_project_assets(project_id, session=session)
+    if not await send_saved_moodboard(callback.bot, callback.message.chat.id, assets):
+        await callback.answer("У проекта нет мудборда.", show_alert=True)
+        return
     await callback.answer()
-    await _show_project_card(callback.message, project_id)
 
 
 # =============================================================================
@@ -271,9 +295,9 @@ async def edit_project_start(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data.startswith("edit_name_"))
-async def edit_project_name_start(callback: CallbackQuery, state: FSMContext):
+async def edit_project_name_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     project_id = int(callback.data.split("_")[2])
-    project = await get_project_by_id(project_id)
+    project = await get_project_by_id(project_id, session=session)
     await state.update_data(project_id=project_id)
     
     await callback.answer()
@@ -284,21 +308,21 @@ async def edit_project_name_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EditProject.editing_name)
 
 @router.message(EditProject.editing_name, F.text)
-async def process_new_name(message: Message, state: FSMContext):
+async def process_new_name(message: Message, state: FSMContext, session: AsyncSession):
     user_data = await state.get_data()
     project_id = user_data.get("project_id")
     new_name = message.text
 
-    project = await update_project_details(project_id=project_id, name=new_name)
+    project = await update_project_details(project_id=project_id, name=new_name, session=session)
         
     await state.clear()
     # Показываем обновленную карточку проекта, а не просто сообщение
-    await _show_project_card(message, project_id)
+    await _show_project_card(message, project_id, session)
 
 @router.callback_query(F.data.startswith("edit_desc_"))
-async def edit_project_desc_start(callback: CallbackQuery, state: FSMContext):
+async def edit_project_desc_start(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     project_id = int(callback.data.split("_")[2])
-    project = await get_project_by_id(project_id)
+    project = await get_project_by_id(project_id, session=session)
     await state.update_data(project_id=project_id)
 
     await callback.answer()
@@ -309,38 +333,38 @@ async def edit_project_desc_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EditProject.editing_description)
 
 @router.message(EditProject.editing_description, F.text)
-async def process_new_description(message: Message, state: FSMContext):
+async def process_new_description(message: Message, state: FSMContext, session: AsyncSession):
     user_data = await state.get_data()
     project_id = user_data.get("project_id")
     new_description = message.text
 
-    project = await update_project_details(project_id=project_id, description=new_description)
+    project = await update_project_details(project_id=project_id, description=new_description, session=session)
         
     await state.clear()
     # Показываем обновленную карточку проекта
-    await _show_project_card(message, project_id)
+    await _show_project_card(message, project_id, session)
 
 # =============================================================================
 # --- ОСТАЛЬНЫЕ ОБРАБОТЧИКИ УПРАВЛЕНИЯ ПРОЕКТОМ ---
 # =============================================================================
 
 @router.callback_query(F.data.startswith(("complete_project_", "cancel_project_")))
-async def archive_project_handler(callback: CallbackQuery):
+async def archive_project_handler(callback: CallbackQuery, session: AsyncSession):
     action, _, project_id_str = callback.data.partition("_project_")
     project_id = int(project_id_str)
     
-    project = await update_project_status(project_id, StatusEnum.ARCHIVED)
+    project = await update_project_status(project_id, StatusEnum.ARCHIVED, session=session)
             
     alert_text = "✅ Проект завершен и перенесен в архив." if action == "complete" else "❌ Проект отменен и перенесен в архив."
     await callback.answer(alert_text, show_alert=True)
     await callback.message.edit_text("🗂 <b>Менеджер Проектов</b>", reply_markup=get_project_manager_keyboard(), parse_mode=ParseMode.HTML)
 
 @router.callback_query(F.data.startswith("delete_project_"))
-async def delete_project_handler(callback: CallbackQuery):
+async def delete_project_handler(callback: CallbackQuery, session: AsyncSession):
     project_id = int(callback.data.split("_")[2])
-    project = await get_project_by_id(project_id)
     
-        
-    await delete_project(project_id)
+    # Мудборд удаленного проекта сохранять уже некуда
+    await moodboard_tasks.cancel(project_id)
+    await delete_project(project_id, session=session)
     await callback.answer("🗑 Идея удалена.", show_alert=True)
     await callback.message.edit_text("🗂 <b>Менеджер Проектов</b>", reply_markup=get_project_manager_keyboard(), parse_mode=ParseMode.HTML)
\ No newline at end of file
@@ -20,12 +20,24 @@ def get_project_manager_keyboard():
     )
     return builder.as_markup()
 
-def get_project_card_keyboard(project_id: int, status: str):
+def get_project_card_keyboard(project_id: int, status: str, has_moodboard: bool = False, moodboard_pending: bool = False):
     """
     Создает универсальную клавиатуру для карточки проекта в зависимости от его статуса.
     """
     builder = InlineKeyboardBuilder()
 
+    # Мудборд еще генерируется в фоне — его можно отменить
+    if moodboard_pending:
+        builder.row(
+            InlineKeyboardButton(text="⛔️ Отменить мудборд", callback_data=f"cancel_moodboard_{project_id}")
+        )
+
+    # Сохраненный мудборд показывается мгновенно, по file_id
+    if has_moodboard:
+        builder.row(
+            InlineKeyboardButton(text="🎨 Показать мудборд", callback_data=f"show_moodboard_{project_id}")
+        )
+
     # Кнопки для статуса 'idea'
     if status == 'idea':
         builder.row(
@@ -99,6 +111,9 @@ def get_moodboard_choice_keyboard():
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text="Да, создать мудборд ✨", callback_data="moodboard_yes"),
+        InlineKeyboardButton(text="Одним коллажем 🧩", callback_data="moodboard_collage")
+    )
+    builder.row(
         InlineKeyboardButton(text="Пропустить ➡️", callback_data="moodboard_no")
     )
     return builder.as_markup()
@@ -4,10 +4,11 @@ from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, Document
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .fsm import AddTemplate
 from .keyboards import get_template_manager_keyboard, get_skip_css_keyboard
-from bot.db.database import add_pdf_template, get_all_templates
+from bot.db.database import add_pdf_template, get_template_summaries
 
 router = Router()
 
@@ -21,12 +22,12 @@ async def manage_templates_handler(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "list_templates")
-async def list_templates_handler(callback: CallbackQuery):
-    templates = await get_all_templates()
+async def list_templates_handler(callback: CallbackQuery, session: AsyncSession):
+    templates = await get_template_summaries(session=session)
     if not templates:
         text = "У вас пока нет ни одного шаблона."
     else:
-        template_list = "\n".join([f"▪️ <code>{t.name}</code>" for t in templates])
+        template_list = "\n".join([f"▪️ <code>{t.name}</code> — {max(t.size // 1024, 1)} КБ" for t in templates])
         text = f"<b>Сохраненные шаблоны:</b>\n\n{template_list}"
     
     await callback.answer()
@@ -63,25 +64,28 @@ async def process_template_html(message: Message, state: FSMContext):
     )
     await state.set_state(AddTemplate.waiting_for_css)
         
-async def save_template(message: Message, state: FSMContext):
+async def save_template(message: Message, state: FSMContext, session: AsyncSession):
     user_data = await state.get_data()
     template_name = user_data.get('name')
     try:
         await add_pdf_template(
             name=template_name,
             html_content=user_data.get("html"),
-            css_content=user_data.get("css")
+            css_content=user_data.get("css"),
+            session=session
         )
         text = f"✅ Шаблон '<b>{template_name}</b>' успешно сохранен!"
         await message.answer(text, reply_markup=get_template_manager_keyboard(), parse_mode=ParseMode.HTML)
     except Exception as e:
+        # Сессия апдейта после ошибки flush непригодна для коммита
+        await session.rollback()
         text = f"❌ Произошла ошибка при сохранении: {e}\n\n<i>Возможно, имя шаблона не уникально.</i>"
         await message.answer(text, reply_markup=get_template_manager_keyboard(), parse_mode=ParseMode.HTML)
     
     await state.clear()
 
 @router.message(AddTemplate.waiting_for_css, F.document)
-async def process_template_css(message: Message, state: FSMContext):
+async def process_template_css(message: Message, state: FSMContext, session: AsyncSession):
     if not message.document.file_name.endswith('.css'):
         await message.answer("Пожалуйста, отправьте файл с расширением <code>.css</code>", parse_mode=ParseMode.HTML)
         return
@@ -90,9 +94,9 @@ async def process_template_css(message: Message, state: FSMContext):
     css_content_bytes = await message.bot.download_file(file.file_path)
     css_content = css_content_bytes.read().decode('utf-8')
     await state.update_data(css=css_content)
-    await save_template(message, state)
+    await save_template(message, state, session)
 
 @router.callback_query(AddTemplate.waiting_for_css, F.data == "skip_css")
-async def skip_template_css(callback: CallbackQuery, state: FSMContext):
+async def skip_template_css(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     await callback.answer()
-    await save_template(callback.message, state)
\ No newline at end of file
+    await save_template(callback.message, state, session)
\ No newline at end of file
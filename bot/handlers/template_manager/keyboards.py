@@ -7,6 +7,9 @@ def get_automations_menu_keyboard():
     builder.row(
         InlineKeyboardButton(text="📄 Генератор контента", callback_data="generate_content")
     )
+    builder.row(
+        InlineKeyboardButton(text="📚 Портфолио из архива", callback_data="build_portfolio")
+    )
     builder.row(
         InlineKeyboardButton(text="🎨 Управление шаблонами", callback_data="manage_templates")
     )
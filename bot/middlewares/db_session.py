@@ -0,0 +1,59 @@
+# file: bot/middlewares/db_session.py
+
+import logging
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.db.database import QueryStats, query_stats
+from bot.db.read_cache import db_cache
+
+logger = logging.getLogger(__name__)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Middleware "unit of work": одна сессия БД на апдейт.
+    Сессия передается хэндлерам аргументом `session`. В конце апдейта изменения
+    фиксируются, а при ошибке откатываются; затем сбрасываются ключи кэша чтений,
+    затронутые записями апдейта. Для каждого апдейта логируется,
+    сколько сессий открыто и сколько запросов выполнено.
+    """
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                data["session"] = session
+                try:
+                    result = await handler(event, data)
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+                finally:
+                    # Повторно сбрасываем ключи кэша, измененные за апдейт
+                    await db_cache.finish_session(session)
+                return result
+        finally:
+            query_stats.reset(token)
+            # Апдейты без обращений к БД (шаги FSM, меню) не логируем
+            if stats.queries:
+                logger.info(
+                    "Update %s: %d DB session(s), %d queries, %.0f ms",
+                    getattr(event, "update_id", "?"),
+                    len(stats.sessions),
+                    stats.queries,
+                    (time.perf_counter() - started) * 1000
+                )
@@ -75,9 +75,18 @@ async def weekly_idea_check(bot: Bot, *args, **kwargs): # Добавил *args,
             print(f"Failed to send weekly digest: {e}")
 
 
+async def prune_llm_cache_job(*args, **kwargs):
+    from bot.services.llm_cache import llm_cache
+    try:
+        await llm_cache.prune()
+    except Exception as e:
+        print(f"Failed to prune LLM cache: {e}")
+
+
 def setup_scheduler(bot: Bot):
     scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
     scheduler.add_job(check_active_projects, 'interval', hours=6, args=[bot])
     scheduler.add_job(weekly_idea_check, 'cron', day_of_week='mon', hour=10, args=[bot])
+    scheduler.add_job(prune_llm_cache_job, 'cron', hour=4)
     scheduler.start()
     print("Scheduler with new logic started.")
\ No newline at end of file
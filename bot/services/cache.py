@@ -0,0 +1,98 @@
+# file: bot/services/cache.py
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+
+@dataclass
+class CacheStats:
+    """Счетчики эффективности кэша."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Простой in-process LRU-кэш с опциональным временем жизни записей.
+    Не потокобезопасен: рассчитан на использование из одного event loop
+    или из одного процесса-воркера.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение и помечает запись как недавно использованную."""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.stats.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.stats.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Сохраняет значение, вытесняя самые старые записи при переполнении."""
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def pop(self, key: Hashable) -> Any:
+        """Удаляет одну запись, если она есть."""
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return None
+        self.stats.invalidations += 1
+        return entry[1]
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Удаляет все записи, ключи которых удовлетворяют условию."""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        self.stats.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        self.stats.invalidations += len(self._data)
+        self._data.clear()
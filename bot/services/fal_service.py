@@ -5,44 +5,81 @@ import httpx
 from google import genai
 from google.genai import types
 from bot.config import settings
+from bot.services.rate_limiter import ai_rate_limiter
 
-async def generate_moodboard(original_prompt: str) -> list[str] | None:
+IMAGEN_MODEL = 'imagen-3.0-generate-001'
+
+# Общий клиент Google AI: создается один раз и переиспользует соединения
+_client: genai.Client | None = None
+
+
+def get_imagen_client() -> genai.Client:
+    """Возвращает общий клиент Google AI, создавая его при первом обращении."""
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=settings.google_ai_api_key)
+    return _client
+
+
+async def close_imagen_client():
+    """Закрывает общий клиент при остановке бота."""
+    global _client
+    if _client is not None:
+        await _client.aio.aclose()
+        _client.close()
+        _client = None
+
+
+def moodboard_prompt(original_prompt: str) -> str:
+    """Промпт для Imagen на основе описания идеи."""
+    return f"A professional product design visualization of {original_prompt}, clean white background, studio lighting, high quality, photorealistic"
+
+
+async def generate_moodboard(original_prompt: str) -> list[bytes] | None:
     """
     Генерирует мудборд из изображений с помощью Google Imagen API.
 
     :param original_prompt: Исходный промпт на русском языке.
-    :return: Список URL сгенерированных изображений или None в случае ошибки.
+    :return: Список изображений (PNG-байты) или None в случае ошибки.
     """
     try:
-        # Инициализируем клиент Google AI
-        client = genai.Client(api_key=settings.google_ai_api_key)
+        client = get_imagen_client()
 
         # Создаем промпт для генерации изображений
-        prompt = f"A professional product design visualization of {original_prompt}, clean white background, studio lighting, high quality, photorealistic"
+        prompt = moodboard_prompt(original_prompt)
 
         print(f"Generated prompt: {prompt}")
 
-        # Генерируем изображения
-        response = client.models.generate_images(
-            model='imagen-3.0-generate-001',
-            prompt=prompt,
-            config=types.GenerateImagesConfig(
-                number_of_images=4,
-                aspect_ratio='1:1',  # Квадратные изображения
-                person_generation='allow_adult',  # Разрешаем генерацию людей если нужно
-            )
+        # Ждем свободной квоты запросов к Imagen
+        await ai_rate_limiter.bucket("imagen", IMAGEN_MODEL).acquire()
+
+        # Генерируем изображения асинхронным API, не блокируя event loop.
+        # По таймауту (или при отмене вызывающей задачи) запрос прерывается
+        response = await asyncio.wait_for(
+            client.aio.models.generate_images(
+                model=IMAGEN_MODEL,
+                prompt=prompt,
+                config=types.GenerateImagesConfig(
+                    number_of_images=4,
+                    aspect_ratio='1:1',  # Квадратные изображения
+                    person_generation='allow_adult',  # Разрешаем генерацию людей если нужно
+                )
+            ),
+            timeout=settings.imagen_timeout
         )
 
-        # Извлекаем URL изображений
-        image_urls = []
-        for generated_image in response.generated_images:
-            # Google Imagen возвращает объекты изображений, но нам нужны URL
-            # Для этого нужно сохранить изображения и загрузить их куда-то
-            # Пока что возвращаем placeholder URL
-            image_urls.append(f"data:image/png;base64,{generated_image.image._image_bytes}")
+        # Imagen возвращает сами изображения; в Telegram они загружаются как файлы
+        images = [
+            generated_image.image.image_bytes
+            for generated_image in response.generated_images or []
+            if generated_image.image and generated_image.image.image_bytes
+        ]
 
-        return image_urls if image_urls else None
+        return images if images else None
 
+    except asyncio.TimeoutError:
+        print(f"Google Imagen не ответил за {settings.imagen_timeout} с, генерация мудборда прервана")
+        return None
     except Exception as e:
         print(f"Ошибка при генерации мудборда через Google Imagen: {e}")
         return None
\ No newline at end of file
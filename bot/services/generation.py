@@ -0,0 +1,419 @@
+# file: bot/services/generation.py
+
+import asyncio
+import html
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import BufferedInputFile, InlineKeyboardMarkup
+
+from bot.config import settings
+from bot.db.database import (
+    get_project_by_id,
+    get_template_by_id,
+    add_project_asset,
+    get_asset_by_cache_key,
+    get_project_assets,
+    get_generation_job,
+    update_generation_job,
+    get_unfinished_generation_jobs
+)
+from bot.db.models import AssetTypeEnum, JobStatusEnum, JobStageEnum, PdfTemplate, Project, ProjectAsset
+from bot.services.generation_cache import project_text_hash, pdf_cache_key, social_text_cache_key
+from bot.services.image_preprocess import preprocess_images, parse_page_size_mm
+from bot.services.image_store import image_store, download_telegram_file
+from bot.services.job_queue import JobQueue
+from bot.services.llm_service import (
+    generate_text_from_draft,
+    generate_card_and_social_texts,
+    CombinedTexts,
+    PDF_CARD_PROMPT,
+    SOCIAL_MEDIA_PROMPT
+)
+from bot.services.pdf_generator import create_project_card_pdf, template_content_hash, validate_template_syntax
+from bot.services.pdf_profiles import get_pdf_profile
+from bot.services.pipeline import StageGraph
+from bot.services.progress import StatusMessage
+from bot.services.render_executor import RenderWorkerError
+
+logger = logging.getLogger(__name__)
+
+# Временные сбои: задача с такой ошибкой возвращается в очередь, а не помечается как ошибочная
+TRANSIENT_ERRORS = (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+    asyncio.TimeoutError,
+    RenderWorkerError,
+)
+
+# Отложенные повторы задач (ссылки нужны, чтобы задачи не собрал сборщик мусора)
+_retry_tasks: set[asyncio.Task] = set()
+
+
+async def _load_images(bot: Bot, images: list[dict]) -> list[bytes]:
+    """
+    Достает изображения из хранилища в памяти.
+    Если запись уже вытеснена, изображение заново скачивается по file_id.
+    """
+    async def load(image: dict) -> bytes:
+        data = image_store.get(image["hash"])
+        if data is None:
+            data = await download_telegram_file(bot, image["file_id"])
+        return data
+
+    return list(await asyncio.gather(*(load(image) for image in images)))
+
+
+async def _save_final_renders(project_id: int, images: list[dict]):
+    """Сохраняет рендеры как ассеты проекта (без дублей по содержимому), чтобы их переиспользовало портфолио."""
+    assets = await get_project_assets(project_id)
+    known_hashes = {asset.cache_key for asset in assets if asset.asset_type == AssetTypeEnum.FINAL_RENDER}
+    for image in images:
+        if image["hash"] not in known_hashes:
+            await add_project_asset(
+                project_id=project_id,
+                asset_type=AssetTypeEnum.FINAL_RENDER,
+                telegram_file_id=image["file_id"],
+                cache_key=image["hash"]
+            )
+            known_hashes.add(image["hash"])
+
+
+@dataclass
+class TemplateStageResult:
+    template: PdfTemplate
+    template_hash: str
+    page_size_mm: tuple[float, float]
+
+
+@dataclass
+class ProjectStageResult:
+    project: Project
+    full_draft: str
+    text_hash: str
+
+
+@dataclass
+class CacheStageResult:
+    pdf_key: str
+    social_key: str
+    cached_pdf: ProjectAsset | None
+    cached_social: ProjectAsset | None
+
+
+async def run_generation(
+    bot: Bot,
+    job_id: int,
+    status: StatusMessage | None = None,
+    result_keyboard: Callable[[int], InlineKeyboardMarkup] | None = None
+):
+    """
+    Генерация PDF-карточки и текста для соцсетей в виде графа этапов:
+
+                                          ┌─ card_text ────────────────┐
+        template ─┐                 ┌─ texts ─┤                            │
+                  ├─ cache ─────────┤         └─ social_text (отправка)    ├─ render ─ upload
+        project ──┘                 └─ fetch_images ─ preprocess ──────────┘
+
+    Независимые этапы идут параллельно: изображения готовятся, пока работает LLM,
+    а текст для соцсетей появляется в чате по мере генерации, не дожидаясь PDF.
+    Рендеринг стартует, как только завершился поток текста карточки. Время каждого этапа логируется.
+    В режиме llm_combined_mode этап texts получает оба текста одним запросом; если ответ
+    не прошел проверку схемы, card_text и social_text делают обычные отдельные запросы.
+
+    Результаты этапов сохраняются в задаче как контрольные точки, поэтому
+    прерванная задача продолжается без повторных запросов к LLM и повторного рендеринга.
+    После временного сбоя (сеть, Telegram, падение процесса рендеринга) задача возвращается
+    в очередь через generation_retry_delay секунд, пока не исчерпан generation_max_attempts.
+    Задача с флагом regenerate не берет готовые результаты из кэшей и запрашивает у LLM новые тексты.
+
+    :param result_keyboard: Строит клавиатуру под готовой карточкой по ID задачи
+        (передается при запуске очереди, чтобы сервис не зависел от хэндлеров).
+    """
+    async def report(text: str):
+        if status:
+            await status.update(f"<i>{text}</i>", force=True)
+
+    job = await get_generation_job(job_id)
+    if job is None or job.status in (JobStatusEnum.DONE, JobStatusEnum.FAILED):
+        return
+    job = await update_generation_job(job_id, status=JobStatusEnum.RUNNING, attempts=job.attempts + 1)
+    graph = StageGraph(name=f"generation-{job_id}")
+
+    @graph.stage("template")
+    async def load_template() -> TemplateStageResult:
+        template = await get_template_by_id(job.template_id)
+        if template is None:
+            raise ValueError("Шаблон был удален.")
+        # Синтаксические ошибки шаблона всплывают до того, как потрачены запросы к LLM
+        validate_template_syntax(template.html_template)
+        return TemplateStageResult(
+            template=template,
+            template_hash=template.content_hash or template_content_hash(template.html_template, template.css_template),
+            page_size_mm=parse_page_size_mm(template.html_template, template.css_template)
+        )
+
+    @graph.stage("project")
+    async def load_project() -> ProjectStageResult:
+        project = await get_project_by_id(job.project_id)
+        if project is None:
+            raise ValueError("Проект был удален.")
+        full_draft = f"Initial Idea: {project.description}\n\nImplementation Details: {job.draft_text}"
+        await _save_final_renders(project.id, job.images)
+        return ProjectStageResult(
+            project=project,
+            full_draft=full_draft,
+            text_hash=project_text_hash(project.name, full_draft)
+        )
+
+    @graph.stage("cache", "template", "project")
+    async def lookup_cache(template: TemplateStageResult, project: ProjectStageResult) -> CacheStageResult:
+        # Ключи кэша: одинаковые входные данные дают одинаковый результат.
+        # Карточка всегда привязана к PDF_CARD_PROMPT: общий запрос (COMBINED_PROMPT) — лишь другой
+        # способ получить тот же текст, и какой из них сработает, до этапа texts неизвестно
+        pdf_key = pdf_cache_key(
+            template.template_hash,
+            project.text_hash,
+            [image["hash"] for image in job.images],
+            PDF_CARD_PROMPT,
+            get_pdf_profile(job.profile).name
+        )
+        social_key = social_text_cache_key(project.text_hash, SOCIAL_MEDIA_PROMPT)
+        if job.regenerate:
+            cached_pdf, cached_social = None, None
+        else:
+            cached_pdf, cached_social = await asyncio.gather(
+                get_asset_by_cache_key(AssetTypeEnum.GENERATED_PDF, pdf_key),
+                get_asset_by_cache_key(AssetTypeEnum.SOCIAL_TEXT, social_key)
+            )
+        if not (job.pdf_file_id or cached_pdf):
+            await report("🧠 Генерирую тексты и готовлю изображения...")
+        return CacheStageResult(pdf_key, social_key, cached_pdf, cached_social)
+
+    @graph.stage("texts", "project", "cache")
+    async def generate_combined_texts(project: ProjectStageResult, cache: CacheStageResult) -> CombinedTexts | None:
+        if not settings.llm_combined_mode:
+            return None
+        card_needed = not (job.pdf_file_id or job.card_text or cache.cached_pdf)
+        social_needed = not (job.social_text or cache.cached_social)
+        # Один общий запрос выгоден, только если нужны оба текста
+        if not (card_needed and social_needed):
+            return None
+        return await generate_card_and_social_texts(project.full_draft, use_cache=not job.regenerate)
+
+    @graph.stage("card_text", "project", "cache", "texts")
+    async def generate_card_text(project: ProjectStageResult, cache: CacheStageResult, texts: CombinedTexts | None) -> str | None:
+        if job.pdf_file_id:
+            return None
+        if job.card_text:
+            return job.card_text
+        if cache.cached_pdf:
+            return cache.cached_pdf.text_content
+        if texts:
+            await update_generation_job(job_id, card_text=texts.card_text, stage=JobStageEnum.TEXTS_READY)
+            return texts.card_text
+        card_text = await generate_text_from_draft(PDF_CARD_PROMPT, project.full_draft, use_cache=not job.regenerate)
+        if not card_text:
+            raise ValueError("LLM не вернула текст для карточки.")
+        await update_generation_job(job_id, card_text=card_text, stage=JobStageEnum.TEXTS_READY)
+        return card_text
+
+    @graph.stage("social_text", "project", "cache", "texts")
+    async def generate_and_send_social_text(project: ProjectStageResult, cache: CacheStageResult, texts: CombinedTexts | None):
+        def format_social_text(text: str, typing: bool = False) -> str:
+            cursor = " ▌" if typing else ""
+            return f"Текст для социальных сетей:\n<pre>{html.escape(text)}{cursor}</pre>"
+
+        # Сообщение, в котором текст появляется по мере генерации
+        social_message: StatusMessage | None = None
+
+        async def show_partial_social_text(text: str):
+            nonlocal social_message
+            if job.social_sent:
+                return
+            if social_message is None:
+                message = await bot.send_message(job.chat_id, format_social_text(text, typing=True), parse_mode=ParseMode.HTML)
+                social_message = StatusMessage(message)
+            else:
+                await social_message.update(format_social_text(text, typing=True))
+
+        social_text = job.social_text or (cache.cached_social.text_content if cache.cached_social else None)
+        if not social_text and texts:
+            social_text = texts.social_text
+            await add_project_asset(
+                project_id=project.project.id,
+                asset_type=AssetTypeEnum.SOCIAL_TEXT,
+                telegram_file_id=None,
+                text_content=social_text,
+                cache_key=cache.social_key
+            )
+        if not social_text:
+            social_text = await generate_text_from_draft(
+                SOCIAL_MEDIA_PROMPT,
+                project.full_draft,
+                use_cache=not job.regenerate,
+                on_chunk=show_partial_social_text
+            )
+            if not social_text:
+                raise ValueError("LLM не вернула текст для соцсетей.")
+            await add_project_asset(
+                project_id=project.project.id,
+                asset_type=AssetTypeEnum.SOCIAL_TEXT,
+                telegram_file_id=None,
+                text_content=social_text,
+                cache_key=cache.social_key
+            )
+        await update_generation_job(job_id, social_text=social_text)
+
+        if not job.social_sent:
+            if social_message:
+                await social_message.update(format_social_text(social_text), force=True)
+            else:
+                await bot.send_message(job.chat_id, format_social_text(social_text), parse_mode=ParseMode.HTML)
+            await update_generation_job(job_id, social_sent=True)
+
+    @graph.stage("fetch_images", "cache")
+    async def fetch_images(cache: CacheStageResult) -> list[bytes]:
+        if job.pdf_file_id or cache.cached_pdf:
+            return []
+        return await _load_images(bot, job.images)
+
+    @graph.stage("preprocess", "template", "fetch_images")
+    async def preprocess(template: TemplateStageResult, images: list[bytes]) -> list[bytes]:
+        if not images:
+            return []
+        profile = get_pdf_profile(job.profile)
+        # Уменьшаем рендеры до размера страницы шаблона и убираем EXIF
+        processed, _ = await preprocess_images(
+            images,
+            page_size_mm=template.page_size_mm,
+            dpi=profile.image_dpi,
+            quality=profile.image_quality
+        )
+        return processed
+
+    @graph.stage("render", "template", "project", "card_text", "preprocess", "cache")
+    async def render(
+        template: TemplateStageResult,
+        project: ProjectStageResult,
+        card_text: str | None,
+        images: list[bytes],
+        cache: CacheStageResult
+    ) -> bytes | None:
+        if job.pdf_file_id or cache.cached_pdf:
+            return None
+        await report("✍️ Тексты готовы. 🖨 Создаю PDF-файл...")
+        return await create_project_card_pdf(
+            project_name=project.project.name,
+            project_description=card_text,
+            images=images,
+            html_template_str=template.template.html_template,
+            css_template_str=template.template.css_template,
+            template_hash=template.template_hash,
+            profile=get_pdf_profile(job.profile)
+        )
+
+    @graph.stage("upload", "project", "card_text", "render", "cache")
+    async def upload(project: ProjectStageResult, card_text: str | None, pdf_bytes: bytes | None, cache: CacheStageResult):
+        if job.pdf_file_id:
+            return
+        caption = "✅ Готово! Ваша презентационная карточка."
+        keyboard = result_keyboard(job_id) if result_keyboard else None
+        if cache.cached_pdf:
+            # Та же карточка уже отправлялась — просто пересылаем документ по file_id
+            await report("📤 Карточка уже есть в архиве, отправляю...")
+            sent = await bot.send_document(
+                job.chat_id, cache.cached_pdf.telegram_file_id, caption=caption, reply_markup=keyboard
+            )
+        else:
+            await report("📤 Отправляю PDF...")
+            pdf_file = BufferedInputFile(pdf_bytes, filename=f"{project.project.name.replace(' ', '_')}_Card.pdf")
+            sent = await bot.send_document(job.chat_id, pdf_file, caption=caption, reply_markup=keyboard)
+            await add_project_asset(
+                project_id=project.project.id,
+                asset_type=AssetTypeEnum.GENERATED_PDF,
+                telegram_file_id=sent.document.file_id,
+                text_content=card_text,
+                cache_key=cache.pdf_key
+            )
+        await update_generation_job(job_id, stage=JobStageEnum.PDF_SENT, pdf_file_id=sent.document.file_id)
+
+    retry = False
+    try:
+        await graph.run()
+        await update_generation_job(job_id, stage=JobStageEnum.FINISHED, status=JobStatusEnum.DONE)
+        await report("✅ Генерация завершена.")
+
+    except Exception as e:
+        if isinstance(e, TRANSIENT_ERRORS) and job.attempts < settings.generation_max_attempts:
+            # Контрольные точки сохранены — повтор продолжит задачу с прерванного этапа
+            retry = True
+            delay = e.retry_after if isinstance(e, TelegramRetryAfter) else settings.generation_retry_delay
+            logger.warning("Generation job %s hit a transient error (%s), retrying in %.0f s", job_id, e, delay)
+            await update_generation_job(job_id, status=JobStatusEnum.QUEUED, error=str(e))
+            try:
+                await report(f"⚠️ Временный сбой, повторю через {delay:.0f} с...")
+            except Exception as report_error:
+                logger.debug("Failed to update status message of job %s: %s", job_id, report_error)
+            _schedule_retry(job_id, status, delay)
+            return
+        await update_generation_job(job_id, status=JobStatusEnum.FAILED, error=str(e))
+        await report("❌ Генерация прервана.")
+        await bot.send_message(job.chat_id, f"❌ <b>Произошла серьезная ошибка во время генерации:</b> {e}", parse_mode=ParseMode.HTML)
+        raise
+    finally:
+        # При повторе изображения еще понадобятся
+        if not retry:
+            image_store.discard([image["hash"] for image in job.images])
+
+
+def _schedule_retry(job_id: int, status: StatusMessage | None, delay: float):
+    """Возвращает задачу в очередь генерации через delay секунд."""
+    async def resubmit():
+        await asyncio.sleep(delay)
+        await generation_queue.submit(job_id, status, force=True)
+
+    task = asyncio.create_task(resubmit(), name=f"generation-retry-{job_id}")
+    _retry_tasks.add(task)
+    task.add_done_callback(_retry_tasks.discard)
+
+
+async def resume_generation_jobs(bot: Bot) -> int:
+    """
+    Возвращает в очередь задачи, прерванные перезапуском бота.
+    Задачи, которые уже несколько раз падали посреди выполнения, помечаются как ошибочные.
+
+    :return: Количество возобновленных задач.
+    """
+    resumed = 0
+    for job in await get_unfinished_generation_jobs():
+        if job.attempts >= settings.generation_max_attempts:
+            await update_generation_job(job.id, status=JobStatusEnum.FAILED, error="Превышено число попыток")
+            continue
+
+        status = None
+        if job.status_message_id:
+            status = StatusMessage(bot=bot, chat_id=job.chat_id, message_id=job.status_message_id)
+            try:
+                await status.update("<i>🔄 Бот перезапустился, продолжаю генерацию...</i>", force=True)
+            except Exception as e:
+                logger.debug("Failed to update status message of job %s: %s", job.id, e)
+        await generation_queue.submit(job.id, status, force=True)
+        resumed += 1
+
+    if resumed:
+        logger.info("Resumed %d unfinished generation jobs", resumed)
+    return resumed
+
+
+# Глобальная очередь генерации: ограничивает число одновременных пайплайнов
+generation_queue = JobQueue(
+    name="generation",
+    concurrency=settings.generation_concurrency,
+    max_size=settings.generation_queue_size,
+)
@@ -0,0 +1,57 @@
+# file: bot/services/generation_cache.py
+
+import hashlib
+
+from bot.config import settings
+
+
+def content_hash(data: bytes | str) -> str:
+    """Возвращает SHA-256 от строки или байтов."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def template_content_hash(html_template_str: str, css_template_str: str | None = None) -> str:
+    """Возвращает SHA-256 от содержимого шаблона (HTML + CSS)."""
+    digest = hashlib.sha256(html_template_str.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((css_template_str or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _model_chain() -> str:
+    """Цепочка моделей из настроек: ответ может прийти от любой из них."""
+    return ",".join(settings.llm_model)
+
+
+def _combine(*parts: str) -> str:
+    return content_hash("\0".join(parts))
+
+
+def project_text_hash(project_name: str, full_draft: str) -> str:
+    """Хэш текстовых входных данных проекта (название попадает в PDF, поэтому входит в ключ)."""
+    return _combine(project_name, full_draft)
+
+
+def pdf_cache_key(
+    template_hash: str,
+    text_hash: str,
+    image_hashes: list[str],
+    prompt: str,
+    profile: str,
+    model: str = None
+) -> str:
+    """
+    Ключ готовой PDF-карточки: шаблон + тексты проекта + содержимое рендеров + профиль + модель.
+    Порядок изображений важен — он определяет раскладку в шаблоне.
+    """
+    return _combine(
+        "pdf", template_hash, text_hash, ",".join(image_hashes),
+        content_hash(prompt), profile, model or _model_chain()
+    )
+
+
+def social_text_cache_key(text_hash: str, prompt: str, model: str = None) -> str:
+    """Ключ текста для соцсетей: от шаблона и изображений он не зависит."""
+    return _combine("social", text_hash, content_hash(prompt), model or _model_chain())
@@ -0,0 +1,106 @@
+# file: bot/services/http_client.py
+
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConnectionStats:
+    """Счетчики переиспользования соединений."""
+    requests: int = 0  # Запросы, реально отправленные в соединение
+    tcp_connects: int = 0
+    tls_handshakes: int = 0
+
+    @property
+    def reused(self) -> int:
+        """Запросы, которые обошлись без нового соединения."""
+        return max(self.requests - self.tcp_connects, 0)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "tcp_connects": self.tcp_connects,
+            "tls_handshakes": self.tls_handshakes,
+            "reused": self.reused,
+        }
+
+
+class PooledHttpClient:
+    """
+    Долгоживущий httpx.AsyncClient с пулом соединений и HTTP/2.
+    Создается лениво при первом запросе и закрывается при остановке бота,
+    поэтому TCP+TLS рукопожатие оплачивается один раз, а не на каждый запрос.
+    """
+
+    def __init__(
+        self,
+        http2: bool,
+        timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float
+    ):
+        self.http2 = http2
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.stats = ConnectionStats()
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(http2=self.http2, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def _trace(self, event_name: str, info: dict):
+        """Колбэк трассировки httpcore: считает запросы, новые соединения и TLS-рукопожатия."""
+        if event_name in ("http11.send_request_headers.started", "http2.send_request_headers.started"):
+            self.stats.requests += 1
+        elif event_name == "connection.connect_tcp.complete":
+            self.stats.tcp_connects += 1
+        elif event_name == "connection.start_tls.complete":
+            self.stats.tls_handshakes += 1
+
+    def _with_trace(self, kwargs: dict) -> dict:
+        extensions = dict(kwargs.pop("extensions", None) or {})
+        extensions["trace"] = self._trace
+        kwargs["extensions"] = extensions
+        return kwargs
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """POST-запрос через общий пул соединений."""
+        return await self.client.post(url, **self._with_trace(kwargs))
+
+    def stream(self, method: str, url: str, **kwargs):
+        """
+        Потоковый запрос через общий пул соединений.
+        Используется как `async with client.stream(...) as response:`.
+        """
+        return self.client.stream(method, url, **self._with_trace(kwargs))
+
+    async def close(self):
+        """Закрывает пул соединений."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("HTTP client closed, connection stats: %s", self.stats.as_dict())
+        self._client = None
+
+
+# Общий клиент для запросов к LLM (OpenRouter)
+llm_http_client = PooledHttpClient(
+    http2=settings.llm_http2,
+    timeout=settings.llm_timeout,
+    max_connections=settings.llm_max_connections,
+    max_keepalive_connections=settings.llm_max_keepalive_connections,
+    keepalive_expiry=settings.llm_keepalive_expiry,
+)
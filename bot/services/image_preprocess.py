@@ -0,0 +1,195 @@
+# file: bot/services/image_preprocess.py
+
+import asyncio
+import io
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from PIL import Image, ImageOps
+
+from bot.config import settings
+from bot.services.pdf_profiles import get_pdf_profile
+
+logger = logging.getLogger(__name__)
+
+# Размеры страниц по CSS Paged Media, в миллиметрах (ширина, высота)
+PAGE_SIZES_MM = {
+    "a3": (297.0, 420.0),
+    "a4": (210.0, 297.0),
+    "a5": (148.0, 210.0),
+    "b4": (250.0, 353.0),
+    "b5": (176.0, 250.0),
+    "letter": (215.9, 279.4),
+    "legal": (215.9, 355.6),
+    "ledger": (279.4, 431.8),
+}
+DEFAULT_PAGE_SIZE_MM = PAGE_SIZES_MM["a4"]
+
+_UNITS_TO_MM = {"mm": 1.0, "cm": 10.0, "in": 25.4, "pt": 25.4 / 72, "pc": 25.4 / 6, "px": 25.4 / 96}
+_PAGE_RULE_RE = re.compile(r"@page\s*(?::\w+\s*)?\{([^}]*)\}", re.IGNORECASE)
+_SIZE_RE = re.compile(r"(?<![-\w])size\s*:\s*([^;}]+)", re.IGNORECASE)
+_LENGTH_RE = re.compile(r"([\d.]+)\s*(mm|cm|in|pt|pc|px)", re.IGNORECASE)
+
+# Потоки для Pillow: декодирование, ресайз и кодирование отпускают GIL
+_executor = ThreadPoolExecutor(
+    max_workers=settings.image_preprocess_workers,
+    thread_name_prefix="image-preprocess",
+)
+
+
+@dataclass
+class PreprocessReport:
+    """Размеры изображений до и после обработки, в байтах."""
+    before: list[int] = field(default_factory=list)
+    after: list[int] = field(default_factory=list)
+
+    @property
+    def total_before(self) -> int:
+        return sum(self.before)
+
+    @property
+    def total_after(self) -> int:
+        return sum(self.after)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.before)} images: {self.total_before / 1024:.0f} KB -> "
+            f"{self.total_after / 1024:.0f} KB"
+        )
+
+
+def parse_page_size_mm(*template_parts: str | None) -> tuple[float, float]:
+    """
+    Определяет размер страницы по правилу @page { size: ... } из HTML/CSS шаблона.
+    Поддерживает именованные форматы (A4, Letter...), ориентацию и явные размеры.
+    Если правило не найдено, возвращается A4.
+    """
+    for part in template_parts:
+        if not part:
+            continue
+        for rule in _PAGE_RULE_RE.findall(part):
+            size_match = _SIZE_RE.search(rule)
+            if not size_match:
+                continue
+            value = size_match.group(1).strip().lower()
+
+            lengths = [float(num) * _UNITS_TO_MM[unit.lower()] for num, unit in _LENGTH_RE.findall(value)]
+            if lengths:
+                width = lengths[0]
+                height = lengths[1] if len(lengths) > 1 else lengths[0]
+                return width, height
+
+            width, height = DEFAULT_PAGE_SIZE_MM
+            for token in value.split():
+                if token in PAGE_SIZES_MM:
+                    width, height = PAGE_SIZES_MM[token]
+            if "landscape" in value:
+                width, height = max(width, height), min(width, height)
+            elif "portrait" in value:
+                width, height = min(width, height), max(width, height)
+            return width, height
+    return DEFAULT_PAGE_SIZE_MM
+
+
+def page_box_pixels(page_size_mm: tuple[float, float], dpi: int) -> tuple[int, int]:
+    """Переводит размер страницы в пиксели для заданного DPI."""
+    width_mm, height_mm = page_size_mm
+    return round(width_mm / 25.4 * dpi), round(height_mm / 25.4 * dpi)
+
+
+def preprocess_image(data: bytes, max_size: tuple[int, int], image_format: str, quality: int) -> bytes:
+    """
+    Уменьшает изображение до размеров страницы, перекодирует его и удаляет EXIF.
+    Изображение никогда не увеличивается.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # Сначала применяем поворот из EXIF, иначе после удаления метаданных фото "ляжет на бок"
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+        image_format = image_format.upper()
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        save_options = {"quality": quality, "optimize": True}
+        if image_format == "JPEG":
+            save_options["progressive"] = True
+        elif image_format == "WEBP":
+            save_options = {"quality": quality, "method": 4}
+        # exif/icc не передаются в save(), поэтому метаданные не попадают в результат
+        image.save(output, format=image_format, **save_options)
+        return output.getvalue()
+
+
+async def preprocess_images(
+    images: list[bytes],
+    page_size_mm: tuple[float, float] = DEFAULT_PAGE_SIZE_MM,
+    dpi: int = None,
+    image_format: str = None,
+    quality: int = None
+) -> tuple[list[bytes], PreprocessReport]:
+    """
+    Параллельно подготавливает изображения к вставке в PDF.
+
+    :param images: Исходные изображения.
+    :param page_size_mm: Размер страницы шаблона в миллиметрах.
+    :param dpi: Целевое разрешение (по умолчанию — из профиля вывода по умолчанию).
+    :param image_format: JPEG или WEBP (по умолчанию из настроек).
+    :param quality: Качество сжатия 1-100 (по умолчанию — из профиля вывода по умолчанию).
+    :return: Обработанные изображения и отчет о размерах.
+    """
+    profile = get_pdf_profile()
+    max_size = page_box_pixels(page_size_mm, dpi or profile.image_dpi)
+    image_format = image_format or settings.image_format
+    quality = quality or profile.image_quality
+
+    loop = asyncio.get_running_loop()
+    processed = await asyncio.gather(*(
+        loop.run_in_executor(_executor, preprocess_image, data, max_size, image_format, quality)
+        for data in images
+    ))
+
+    report = PreprocessReport(before=[len(data) for data in images], after=[len(data) for data in processed])
+    logger.info("Image preprocessing (%s, q=%s, box=%sx%s px): %s", image_format, quality, *max_size, report)
+    return list(processed), report
+
+
+def compose_grid(images: list[bytes], columns: int, tile_size: int, gap: int, quality: int) -> bytes:
+    """
+    Собирает изображения в одну сетку (коллаж) с белыми промежутками.
+    Каждое изображение вписывается в квадратную ячейку tile_size и центрируется в ней.
+    """
+    rows = -(-len(images) // columns)
+    width = columns * tile_size + (columns + 1) * gap
+    height = rows * tile_size + (rows + 1) * gap
+    collage = Image.new("RGB", (width, height), "white")
+
+    for index, data in enumerate(images):
+        with Image.open(io.BytesIO(data)) as image:
+            tile = ImageOps.exif_transpose(image).convert("RGB")
+            tile.thumbnail((tile_size, tile_size), Image.Resampling.LANCZOS)
+            row, column = divmod(index, columns)
+            x = gap + column * (tile_size + gap) + (tile_size - tile.width) // 2
+            y = gap + row * (tile_size + gap) + (tile_size - tile.height) // 2
+            collage.paste(tile, (x, y))
+
+    output = io.BytesIO()
+    collage.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+async def compose_collage(
+    images: list[bytes],
+    columns: int = 2,
+    tile_size: int = None,
+    gap: int = 8,
+    quality: int = 90
+) -> bytes:
+    """Собирает коллаж в пуле потоков, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, compose_grid, images, columns, tile_size or settings.moodboard_collage_tile_size, gap, quality
+    )
@@ -0,0 +1,75 @@
+# file: bot/services/image_store.py
+
+from aiogram import Bot
+from weasyprint import default_url_fetcher
+
+from bot.services.cache import LRUCache
+from bot.services.generation_cache import content_hash
+
+MEM_SCHEME = "mem://"
+
+
+def mem_url(key: str) -> str:
+    """Возвращает URL, по которому WeasyPrint получит изображение из памяти."""
+    return f"{MEM_SCHEME}{key}"
+
+
+async def download_telegram_file(bot: Bot, file_id: str) -> bytes:
+    """Скачивает файл из Telegram в память."""
+    file = await bot.get_file(file_id)
+    buffer = await bot.download_file(file.file_path)
+    return buffer.getvalue()
+
+
+def sniff_mime_type(data: bytes) -> str | None:
+    """Определяет MIME-тип изображения по сигнатуре."""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def make_url_fetcher(images: dict[str, bytes]):
+    """
+    Создает url_fetcher для WeasyPrint, который отдает изображения
+    с адресами mem://<hash> из памяти, а остальные URL — стандартным способом.
+    """
+    def fetcher(url: str, *args, **kwargs) -> dict:
+        if url.startswith(MEM_SCHEME):
+            key = url[len(MEM_SCHEME):]
+            data = images[key]
+            return {"string": data, "mime_type": sniff_mime_type(data), "redirected_url": url}
+        return default_url_fetcher(url, *args, **kwargs)
+
+    return fetcher
+
+
+class ImageStore:
+    """
+    Временное хранилище скачанных изображений в памяти главного процесса.
+    Записи живут ограниченное время: если пользователь бросил сценарий,
+    память освободится сама, а при промахе изображение можно скачать заново по file_id.
+    """
+
+    def __init__(self, maxsize: int = 50, ttl: float = 3600):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def put(self, data: bytes) -> str:
+        """Сохраняет изображение и возвращает его ключ (SHA-256 содержимого)."""
+        key = content_hash(data)
+        self._cache.set(key, data)
+        return key
+
+    def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    def discard(self, keys: list[str]):
+        for key in keys:
+            self._cache.pop(key)
+
+
+# Глобальное хранилище, общее для всех хэндлеров
+image_store = ImageStore()
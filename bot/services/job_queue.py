@@ -0,0 +1,167 @@
+# file: bot/services/job_queue.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from bot.services.progress import StatusMessage
+
+logger = logging.getLogger(__name__)
+
+# Функция, выполняющая задачу: (данные задачи, статусное сообщение) -> None
+JobRunner = Callable[[Any, StatusMessage | None], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Очередь заполнена, новая задача не принята."""
+
+
+@dataclass
+class QueuedJob:
+    payload: Any
+    status: StatusMessage | None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class QueueMetrics:
+    """Метрики очереди для мониторинга."""
+    submitted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    failed: int = 0
+    # Время ожидания последних задач в очереди, в секундах
+    wait_times: deque = field(default_factory=lambda: deque(maxlen=100))
+
+    def as_dict(self) -> dict:
+        waits = list(self.wait_times)
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+            "max_wait": max(waits) if waits else 0.0,
+        }
+
+
+class JobQueue:
+    """
+    Ограниченная очередь фоновых задач с фиксированным числом воркеров.
+    Когда очередь заполнена, новые задачи отклоняются (backpressure),
+    а ожидающим задачам сообщается их текущая позиция.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.metrics = QueueMetrics()
+        self._pending: deque[QueuedJob] = deque()
+        self._has_jobs = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        self._running = 0
+        self._runner: JobRunner | None = None
+        # Обновление позиций идет отдельной задачей и не задерживает запуск следующей
+        self._notifier: asyncio.Task | None = None
+        self._positions_dirty = False
+
+    @property
+    def depth(self) -> int:
+        """Количество задач, ожидающих выполнения."""
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        """Количество задач, выполняющихся прямо сейчас."""
+        return self._running
+
+    def start(self, runner: JobRunner):
+        """Запускает воркеры очереди."""
+        self._runner = runner
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info("Job queue '%s' started: %d workers, max %d queued", self.name, self.concurrency, self.max_size)
+
+    async def stop(self):
+        """Останавливает воркеры. Незавершенные задачи отменяются."""
+        tasks = self._workers + ([self._notifier] if self._notifier else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._notifier = None
+
+    async def submit(self, payload: Any, status: StatusMessage | None = None, force: bool = False) -> int:
+        """
+        Ставит задачу в очередь.
+
+        :param force: Принять задачу даже при заполненной очереди (для восстановленных задач).
+        :return: Позиция задачи в очереди (1 — следующая на выполнение).
+        :raises QueueFullError: Если очередь заполнена.
+        """
+        if not force and len(self._pending) >= self.max_size:
+            self.metrics.rejected += 1
+            raise QueueFullError(f"Очередь '{self.name}' заполнена ({self.max_size} задач)")
+
+        self._pending.append(QueuedJob(payload=payload, status=status))
+        self.metrics.submitted += 1
+        position = len(self._pending)
+        self._has_jobs.set()
+        if status and self._running >= self.concurrency:
+            await status.update(f"<i>⏳ В очереди: #{position}</i>", force=True)
+        return position
+
+    def _schedule_position_updates(self):
+        """
+        Запрашивает обновление позиций ожидающих задач. Запросы, пришедшие во время
+        обхода очереди, объединяются в один следующий проход.
+        """
+        self._positions_dirty = True
+        if self._notifier is None or self._notifier.done():
+            self._notifier = asyncio.create_task(self._notify_positions(), name=f"{self.name}-positions")
+
+    async def _notify_positions(self):
+        """Сообщает ожидающим задачам их новые позиции."""
+        while self._positions_dirty:
+            self._positions_dirty = False
+            for position, job in enumerate(list(self._pending), start=1):
+                if self._positions_dirty:
+                    # Очередь сдвинулась — начинаем проход заново с актуальными позициями
+                    break
+                # Задача могла уже уйти в работу — ее статус не перезаписываем
+                if job.status and job in self._pending:
+                    try:
+                        await job.status.update(f"<i>⏳ В очереди: #{position}</i>")
+                    except Exception as e:
+                        logger.debug("Failed to update queue position: %s", e)
+
+    async def _worker(self):
+        while True:
+            await self._has_jobs.wait()
+            if not self._pending:
+                self._has_jobs.clear()
+                continue
+
+            job = self._pending.popleft()
+            if not self._pending:
+                self._has_jobs.clear()
+            self.metrics.wait_times.append(time.monotonic() - job.enqueued_at)
+            self._schedule_position_updates()
+
+            self._running += 1
+            try:
+                await self._runner(job.payload, job.status)
+                self.metrics.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.metrics.failed += 1
+                logger.exception("Job in queue '%s' failed", self.name)
+            finally:
+                self._running -= 1
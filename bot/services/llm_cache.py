@@ -0,0 +1,118 @@
+# file: bot/services/llm_cache.py
+
+import datetime
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+
+from bot.config import settings
+from bot.db.database import get_llm_cache_entry, save_llm_cache_entry, prune_llm_cache
+from bot.services.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def llm_cache_key(endpoint: str, model: str, temperature: float, max_tokens: int, prompt: str) -> str:
+    """Ключ кэша: все параметры, от которых зависит ответ модели, плюс хэш итогового промпта."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps([endpoint, model, temperature, max_tokens, prompt_hash])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class LlmCacheStats:
+    """Счетчики двухуровневого кэша."""
+    memory_hits: int = 0
+    db_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.db_hits + self.misses
+        return (self.memory_hits + self.db_hits) / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+class LlmResponseCache:
+    """
+    Двухуровневый кэш ответов LLM: LRU в памяти процесса перед таблицей в БД.
+    Таблица переживает перезапуски бота; ошибки БД не ломают генерацию, а считаются промахом.
+    """
+
+    def __init__(self, enabled: bool, ttl: int, memory_size: int, max_rows: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.stats = LlmCacheStats()
+        self._memory = LRUCache(maxsize=memory_size, ttl=ttl or None)
+
+    async def get(self, key: str) -> str | None:
+        """Ищет ответ сначала в памяти, затем в БД."""
+        if not self.enabled:
+            return None
+
+        response = self._memory.get(key)
+        if response is not None:
+            self.stats.memory_hits += 1
+            return response
+
+        try:
+            entry = await get_llm_cache_entry(key)
+        except Exception as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+            entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.db_hits += 1
+        if entry.expires_at is None:
+            self._memory.set(key, entry.response)
+        else:
+            # В памяти запись живет не дольше, чем в БД
+            remaining = (entry.expires_at - datetime.datetime.now()).total_seconds()
+            if remaining > 0:
+                self._memory.set(key, entry.response, ttl=remaining)
+        return entry.response
+
+    async def set(self, key: str, model: str, response: str):
+        """Сохраняет ответ на обоих уровнях."""
+        if not self.enabled:
+            return
+        self._memory.set(key, response)
+        expires_at = datetime.datetime.now() + datetime.timedelta(seconds=self.ttl) if self.ttl else None
+        try:
+            await save_llm_cache_entry(key, model, response, expires_at)
+        except Exception as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+    def record_bypass(self):
+        """Учитывает запрос, намеренно выполненный мимо кэша (перегенерация)."""
+        self.stats.bypassed += 1
+
+    async def prune(self) -> int:
+        """Удаляет из таблицы просроченные записи и записи сверх лимита."""
+        removed = await prune_llm_cache(self.max_rows)
+        if removed:
+            logger.info("LLM cache pruned: %d entries removed", removed)
+        return removed
+
+
+# Глобальный кэш ответов LLM
+llm_cache = LlmResponseCache(
+    enabled=settings.llm_cache_enabled,
+    ttl=settings.llm_cache_ttl,
+    memory_size=settings.llm_cache_memory_size,
+    max_rows=settings.llm_cache_max_rows,
+)
@@ -1,7 +1,136 @@
 # file: bot/services/llm_service.py
 
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
 import httpx
+from pydantic import BaseModel, Field, ValidationError
 from bot.config import settings
+from bot.services.http_client import llm_http_client
+from bot.services.llm_cache import llm_cache, llm_cache_key
+from bot.services.rate_limiter import Priority, ai_rate_limiter
+from bot.services.resilience import (
+    Admission,
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    RetryPolicy,
+    parse_retry_after,
+    run_hedged
+)
+
+logger = logging.getLogger(__name__)
+
+# Колбэк потоковой генерации: получает весь накопленный на текущий момент текст
+ChunkCallback = Callable[[str], Awaitable[None]]
+
+# Коды ответа, при которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+
+class LlmStreamError(Exception):
+    """Провайдер сообщил об ошибке посреди потока ответа."""
+
+
+@dataclass
+class LlmRequestMetrics:
+    """Метрики одного запроса к LLM."""
+    streamed: bool
+    duration: float
+    time_to_first_token: float | None = None
+    completion_tokens: int = 0
+
+    @property
+    def tokens_per_second(self) -> float:
+        # Скорость считается от первого токена: ожидание в очереди провайдера ее не искажает
+        generation_time = self.duration - (self.time_to_first_token or 0.0)
+        return self.completion_tokens / generation_time if generation_time > 0 else 0.0
+
+
+@dataclass
+class LlmStats:
+    """Метрики последних запросов к LLM."""
+    requests: int = 0
+    failed: int = 0
+    retries: int = 0
+    hedged: int = 0
+    # Ответы, полученные не от первой модели в списке
+    fallbacks: int = 0
+    recent: deque = field(default_factory=lambda: deque(maxlen=100))
+
+    def record(self, metrics: LlmRequestMetrics):
+        self.requests += 1
+        self.recent.append(metrics)
+        ttft = f"{metrics.time_to_first_token:.2f} s" if metrics.time_to_first_token is not None else "n/a"
+        logger.info(
+            "LLM request finished in %.2f s (streamed=%s, TTFT %s, %d tokens, %.1f tok/s)",
+            metrics.duration, metrics.streamed, ttft, metrics.completion_tokens, metrics.tokens_per_second
+        )
+
+    def as_dict(self) -> dict:
+        recent = list(self.recent)
+        ttfts = [m.time_to_first_token for m in recent if m.time_to_first_token is not None]
+        speeds = [m.tokens_per_second for m in recent if m.completion_tokens]
+        return {
+            "requests": self.requests,
+            "failed": self.failed,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "fallbacks": self.fallbacks,
+            "avg_duration": sum(m.duration for m in recent) / len(recent) if recent else 0.0,
+            "avg_ttft": sum(ttfts) / len(ttfts) if ttfts else 0.0,
+            "avg_tokens_per_second": sum(speeds) / len(speeds) if speeds else 0.0,
+        }
+
+
+llm_stats = LlmStats()
+
+llm_retry_policy = RetryPolicy(
+    max_attempts=settings.llm_retry_attempts,
+    base_delay=settings.llm_retry_base_delay,
+    max_delay=settings.llm_retry_max_delay,
+)
+# Предохранители и замеры задержек ведутся отдельно для каждой модели
+_breakers: dict[str, CircuitBreaker] = {}
+_latencies: dict[str, LatencyTracker] = {}
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    if model not in _breakers:
+        _breakers[model] = CircuitBreaker(
+            name=model,
+            failure_threshold=settings.llm_circuit_failure_threshold,
+            reset_timeout=settings.llm_circuit_reset_timeout,
+        )
+    return _breakers[model]
+
+
+def get_circuit_states() -> dict[str, str]:
+    """Состояние предохранителей по моделям (для /stats)."""
+    return {model: breaker.state for model, breaker in _breakers.items()}
+
+
+def _hedge_delay(model: str) -> float | None:
+    """Через сколько секунд отправлять дубликат запроса: перцентиль недавних задержек модели."""
+    if settings.llm_hedge_percentile <= 0:
+        return None
+    latency = _latencies.get(model)
+    if latency is None or len(latency) < settings.llm_hedge_min_samples:
+        return None
+    return latency.percentile(settings.llm_hedge_percentile)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return isinstance(error, (httpx.TransportError, LlmStreamError))
+
 
 # Ваши промпты из ТЗ
 PDF_CARD_PROMPT = """Напиши подробное описание проекта промышленного дизайна на основе черновика ниже. Текст должен:
@@ -25,16 +154,277 @@ SOCIAL_MEDIA_PROMPT = """Создай лаконичный текст для с
 - Укладываться в 2-3 предложения + хэштеги (например: #IndustrialDesign #Innovation + подходящие к проекту хэштеги).
 Черновик: [Draft]"""
 
-async def generate_text_from_draft(prompt_template: str, draft: str) -> str | None:
+COMBINED_PROMPT = """На основе черновика ниже подготовь два текста о проекте промышленного дизайна.
+
+1. card_text — подробное описание проекта для PDF-карточки. Текст должен:
+- Использовать позитивный и дружелюбный тон.
+- Чётко описать идею проекта, его реализацию и предмет дизайна.
+- Объяснить назначение и функцию предмета.
+- Включать профессиональную лексику (например: эргономика, материалы, производственный процесс).
+- Быть на английском языке уровня B1-B2 (простые предложения, базовые технические термины).
+- Иметь структуру:
+        - Заголовок проекта (1 строка).
+        - Описание идеи (2-3 предложения).
+        - Детали реализации (материалы/технологии, 2 предложения).
+        - Функциональность предмета (1-2 предложения).
+
+2. social_text — лаконичный текст для соцсетей (TikTok/Instagram). Текст должен:
+- Быть позитивным, дружелюбным и engaging (используй эмодзи 😊).
+- Кратко описать идею проекта, предмет дизайна и его функцию.
+- Использовать профессиональную лексику упрощённо (например: "эргономичный дизайн", "инновационные материалы").
+- Соответствовать английскому уровню B1-B2 (короткие предложения, простые глаголы).
+- Укладываться в 2-3 предложения + хэштеги (например: #IndustrialDesign #Innovation + подходящие к проекту хэштеги).
+
+Ответь только JSON-объектом без пояснений и без markdown:
+{"card_text": "...", "social_text": "..."}
+Черновик: [Draft]"""
+
+
+class CombinedTexts(BaseModel):
+    """Схема ответа на COMBINED_PROMPT."""
+    card_text: str = Field(min_length=1)
+    social_text: str = Field(min_length=1)
+
+
+def parse_combined_texts(raw: str) -> CombinedTexts | None:
+    """
+    Разбирает ответ модели на COMBINED_PROMPT.
+    Модели часто оборачивают JSON в ```-блок или добавляют текст вокруг, поэтому берется
+    фрагмент от первой '{' до последней '}'.
+
+    :return: Проверенные тексты или None, если ответ не соответствует схеме.
+    """
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        texts = CombinedTexts.model_validate_json(raw[start:end + 1])
+    except ValidationError:
+        return None
+    return CombinedTexts(card_text=texts.card_text.strip(), social_text=texts.social_text.strip())
+
+
+async def _complete(
+    headers: dict,
+    json_data: dict,
+    on_chunk: ChunkCallback | None,  # pylint: disable=unused-argument
+    claim: Callable[[], bool]  # pylint: disable=unused-argument
+) -> tuple[str, LlmRequestMetrics]:
+    """
+    Обычный запрос: ответ приходит целиком.
+    Сигнатура совпадает с _complete_stream, чтобы режимы были взаимозаменяемы. on_chunk не вызывается:
+    показ текста по мере генерации работает только при llm_stream. claim не нужен: дубликат
+    отменяется, когда одна из попыток завершится.
+    """
+    started = time.perf_counter()
+    # Общий клиент с пулом соединений: без нового TCP+TLS рукопожатия на каждый запрос
+    response = await llm_http_client.post(settings.llm_api_endpoint, headers=headers, json=json_data)
+    response.raise_for_status() # Вызовет исключение для кодов 4xx/5xx
+
+    data = response.json()
+    # Извлекаем текст из структуры ответа OpenRouter
+    generated_text = data["choices"][0]["message"]["content"]
+    metrics = LlmRequestMetrics(
+        streamed=False,
+        duration=time.perf_counter() - started,
+        completion_tokens=(data.get("usage") or {}).get("completion_tokens", 0)
+    )
+    return generated_text, metrics
+
+
+async def _complete_stream(
+    headers: dict,
+    json_data: dict,
+    on_chunk: ChunkCallback | None,
+    claim: Callable[[], bool]
+) -> tuple[str, LlmRequestMetrics]:
+    """
+    Потоковый запрос (server-sent events): текст приходит по частям,
+    и каждая часть сразу передается в on_chunk.
+    Первый токен «занимает» ответ (claim): дублирующий запрос при этом отменяется.
+    """
+    started = time.perf_counter()
+    time_to_first_token = None
+    chunks: list[str] = []
+    completion_tokens = 0
+
+    json_data = {**json_data, "stream": True, "stream_options": {"include_usage": True}}
+    async with llm_http_client.stream("POST", settings.llm_api_endpoint, headers=headers, json=json_data) as response:
+        if response.is_error:
+            await response.aread()
+            response.raise_for_status()
+
+        async for line in response.aiter_lines():
+            # Пустые строки разделяют события, строки с ':' — комментарии (keep-alive OpenRouter)
+            if not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+
+            event = json.loads(payload)
+            if "error" in event:
+                raise LlmStreamError(f"Ошибка в потоке ответа: {event['error']}")
+            if event.get("usage"):
+                completion_tokens = event["usage"].get("completion_tokens", completion_tokens)
+
+            choices = event.get("choices") or []
+            delta = choices[0].get("delta", {}).get("content") if choices else None
+            if not delta:
+                continue
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - started
+            chunks.append(delta)
+            if claim() and on_chunk:
+                try:
+                    await on_chunk("".join(chunks))
+                except Exception as e:
+                    # Сбой показа (flood wait, ошибка редактирования) не должен обрывать ответ модели
+                    logger.warning("Failed to show partial LLM response: %s", e)
+
+    metrics = LlmRequestMetrics(
+        streamed=True,
+        duration=time.perf_counter() - started,
+        time_to_first_token=time_to_first_token,
+        # Если провайдер не прислал usage, считаем приблизительно по числу фрагментов
+        completion_tokens=completion_tokens or len(chunks)
+    )
+    return "".join(chunks), metrics
+
+
+def _estimate_prompt_tokens(prompt: str) -> int:
+    """Грубая оценка числа токенов промпта (~4 символа на токен) для учета квоты."""
+    return len(prompt) // 4 + 1
+
+
+async def _request_with_fallbacks(
+    headers: dict,
+    json_data: dict,
+    on_chunk: ChunkCallback | None,
+    priority: Priority
+) -> tuple[str, LlmRequestMetrics, str]:
+    """
+    Отправляет запрос, перебирая модели из settings.llm_model по порядку.
+    Для каждой модели: повторы с экспоненциальной задержкой (с учетом Retry-After),
+    дублирующий запрос при долгом ответе и предохранитель, который пропускает модель после серии ошибок.
+
+    :return: (текст, метрики, модель, которая ответила).
+    :raises Exception: Последняя ошибка, если не ответила ни одна модель.
+    """
+    complete = _complete_stream if settings.llm_stream else _complete
+    last_error: Exception | None = None
+    prompt_tokens = _estimate_prompt_tokens(json_data["messages"][-1]["content"])
+    # До ответа резервируем квоту на максимальную длину, лишнее возвращаем после
+    reserved_tokens = prompt_tokens + json_data["max_tokens"]
+
+    for model_index, model in enumerate(settings.llm_model):
+        breaker = get_circuit_breaker(model)
+        bucket = ai_rate_limiter.bucket("openrouter", model)
+        request_data = {**json_data, "model": model}
+
+        async def send_attempt(claim: Callable[[], bool]) -> tuple[str, LlmRequestMetrics]:
+            # Квота на попытку уже занята; неиспользованный резерв возвращаем и при ошибке
+            completion_tokens = 0
+            try:
+                text, metrics = await complete(headers, request_data, on_chunk, claim)
+                completion_tokens = metrics.completion_tokens
+                return text, metrics
+            finally:
+                bucket.refund(max(reserved_tokens - prompt_tokens - completion_tokens, 0))
+
+        for attempt_no in range(llm_retry_policy.max_attempts):
+            admission = breaker.allow()
+            if not admission:
+                last_error = CircuitOpenError(f"Модель {model} временно отключена после серии ошибок")
+                break
+            error = None
+            try:
+                # Квоту ждем до запуска отсчета hedge_after, чтобы очередь за ней не порождала дубликат.
+                # Дубликат отправляется, только если квота на него свободна прямо сейчас
+                await bucket.acquire(reserved_tokens, priority)
+                (text, metrics), hedged = await run_hedged(
+                    send_attempt,
+                    _hedge_delay(model),
+                    can_hedge=lambda: bucket.try_acquire(reserved_tokens)
+                )
+            except Exception as e:
+                error = last_error = e
+                if isinstance(e, httpx.HTTPStatusError) and 400 <= e.response.status_code < 500 and not _is_retryable(e):
+                    # Модель ответила отказом (400, 401, 404...), значит, она доступна: дело в самом запросе
+                    breaker.record_success()
+                else:
+                    # Сетевые ошибки, 5xx, 429 и испорченные ответы (нет choices, битый JSON) — сбой модели
+                    breaker.record_failure()
+            else:
+                breaker.record_success()
+            finally:
+                if admission is Admission.PROBE:
+                    # Отмененный пробный запрос не должен оставить модель отключенной навсегда
+                    breaker.release()
+
+            if error is not None:
+                if not _is_retryable(error):
+                    # Ошибка запроса (400, 401, 404...): повтор не поможет, пробуем следующую модель
+                    logger.warning("LLM model %s rejected the request: %s", model, error)
+                    break
+                if attempt_no + 1 >= llm_retry_policy.max_attempts:
+                    break
+                retry_after = None
+                if isinstance(error, httpx.HTTPStatusError):
+                    retry_after = parse_retry_after(error.response.headers.get("Retry-After"))
+                delay = llm_retry_policy.delay(attempt_no, retry_after)
+                llm_stats.retries += 1
+                logger.warning("LLM request to %s failed (%s), retry %d in %.1f s", model, error, attempt_no + 1, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            _latencies.setdefault(model, LatencyTracker()).record(
+                metrics.time_to_first_token if metrics.time_to_first_token is not None else metrics.duration
+            )
+            if hedged:
+                llm_stats.hedged += 1
+            if model_index > 0:
+                llm_stats.fallbacks += 1
+            return text, metrics, model
+
+    raise last_error or CircuitOpenError("Не настроено ни одной модели")
+
+
+async def generate_text_from_draft(
+    prompt_template: str,
+    draft: str,
+    use_cache: bool = True,
+    on_chunk: ChunkCallback | None = None,
+    validate: Callable[[str], bool] | None = None,
+    priority: Priority = Priority.INTERACTIVE
+) -> str | None:
     """
     Генерирует текст с помощью OpenRouter API (Llama 3.3).
+    Временные ошибки повторяются, а при отказе модели запрос уходит следующей из settings.llm_model.
 
     :param prompt_template: Шаблон промпта (PDF_CARD_PROMPT или SOCIAL_MEDIA_PROMPT).
     :param draft: Черновик текста от пользователя.
+    :param use_cache: False — запросить новый ответ мимо кэша (перегенерация); он заменит закэшированный.
+    :param on_chunk: Колбэк для показа текста по мере генерации (при включенном llm_stream).
+        Для ответа из кэша не вызывается.
+    :param validate: Проверка ответа: в кэш попадают только ответы, прошедшие ее.
+    :param priority: Приоритет в очереди за квотой запросов (фоновые задачи — Priority.BATCH).
     :return: Сгенерированный текст или None в случае ошибки.
     """
     # Подставляем черновик в промпт
     final_prompt = prompt_template.replace("[Draft]", draft)
+    temperature = 0.7
+    max_tokens = 1000
+
+    # В ключ входит вся цепочка моделей: ответ может прийти от любой из них
+    model_chain = ",".join(settings.llm_model)
+    cache_key = llm_cache_key(settings.llm_api_endpoint, model_chain, temperature, max_tokens, final_prompt)
+    if use_cache:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    else:
+        llm_cache.record_bypass()
 
     headers = {
         "Authorization": f"Bearer {settings.llm_api_key}",
@@ -43,32 +433,54 @@ async def generate_text_from_draft(prompt_template: str, draft: str) -> str | No
         "X-Title": "DesignFlow Assistant Bot"
     }
 
-    # Структура тела запроса для OpenRouter API
+    # Структура тела запроса для OpenRouter API (модель подставляется при отправке)
     json_data = {
-        "model": settings.llm_model,
         "messages": [
             {
                 "role": "user",
                 "content": final_prompt
             }
         ],
-        "temperature": 0.7,
-        "max_tokens": 1000
+        "temperature": temperature,
+        "max_tokens": max_tokens
     }
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(settings.llm_api_endpoint, headers=headers, json=json_data)
-            response.raise_for_status() # Вызовет исключение для кодов 4xx/5xx
+        generated_text, metrics, model = await _request_with_fallbacks(headers, json_data, on_chunk, priority)
+        llm_stats.record(metrics)
 
-            data = response.json()
-            # Извлекаем текст из структуры ответа OpenRouter
-            generated_text = data["choices"][0]["message"]["content"]
-            return generated_text.strip()
+        generated_text = generated_text.strip()
+        if generated_text and (validate is None or validate(generated_text)):
+            await llm_cache.set(cache_key, model, generated_text)
+        return generated_text
 
     except httpx.HTTPStatusError as e:
+        llm_stats.failed += 1
         print(f"Ошибка HTTP при обращении к OpenRouter API: {e.response.status_code} - {e.response.text}")
         return None
     except Exception as e:
+        llm_stats.failed += 1
         print(f"Непредвиденная ошибка при обращении к OpenRouter API: {e}")
         return None
+
+
+async def generate_card_and_social_texts(draft: str, use_cache: bool = True) -> CombinedTexts | None:
+    """
+    Генерирует текст карточки и текст для соцсетей одним запросом (COMBINED_PROMPT).
+    Входные токены черновика оплачиваются один раз вместо двух.
+
+    :return: Оба текста или None, если запрос не удался или ответ не прошел проверку схемы —
+        тогда вызывающий код переходит на два отдельных запроса.
+    """
+    raw = await generate_text_from_draft(
+        COMBINED_PROMPT,
+        draft,
+        use_cache=use_cache,
+        validate=lambda text: parse_combined_texts(text) is not None
+    )
+    if not raw:
+        return None
+    texts = parse_combined_texts(raw)
+    if texts is None:
+        logger.warning("Combined LLM response does not match the schema, falling back to two requests")
+    return texts
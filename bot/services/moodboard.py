@@ -0,0 +1,226 @@
+# file: bot/services/moodboard.py
+
+import asyncio
+import logging
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.types import BufferedInputFile
+from aiogram.utils.media_group import MediaGroupBuilder
+
+from bot.config import settings
+from bot.db.database import add_project_asset, get_assets_by_cache_key
+from bot.db.models import AssetTypeEnum, ProjectAsset
+from bot.services.cache import LRUCache
+from bot.services.fal_service import IMAGEN_MODEL, generate_moodboard, moodboard_prompt
+from bot.services.generation_cache import content_hash
+from bot.services.image_preprocess import compose_collage
+
+logger = logging.getLogger(__name__)
+
+MOODBOARD_CAPTION = "Вот несколько визуальных идей:"
+
+# Сгенерированные наборы изображений по хэшу промпта: из одного набора
+# можно собрать и медиагруппу, и коллаж без повторного запроса к Imagen
+_image_sets = LRUCache(maxsize=settings.moodboard_cache_size, ttl=settings.moodboard_cache_ttl)
+
+
+def moodboard_cache_key(prompt: str, collage: bool) -> str:
+    """Ключ отправленного мудборда: промпт, модель и вид (коллаж или медиагруппа)."""
+    layout = "collage" if collage else "album"
+    return content_hash("\0".join(["moodboard", IMAGEN_MODEL, layout, content_hash(prompt)]))
+
+
+async def _send_moodboard(bot: Bot, chat_id: int, media: list, caption: str = MOODBOARD_CAPTION) -> list[str]:
+    """
+    Отправляет изображения одним фото или медиагруппой.
+    В медиагруппе Telegram допускает от 2 до 10 элементов.
+
+    :return: file_id отправленных изображений.
+    """
+    if len(media) == 1:
+        message = await bot.send_photo(chat_id, media[0], caption=caption)
+        return [message.photo[-1].file_id]
+
+    media_group = MediaGroupBuilder(caption=caption)
+    for item in media[:10]:
+        media_group.add_photo(media=item)
+    messages = await bot.send_media_group(chat_id, media=media_group.build())
+    return [message.photo[-1].file_id for message in messages if message.photo]
+
+
+async def create_project_moodboard(
+    bot: Bot,
+    chat_id: int,
+    project_id: int,
+    description: str,
+    collage: bool = False,
+    caption: str = MOODBOARD_CAPTION,
+    track_save: Callable[[asyncio.Task], None] | None = None
+) -> list[str] | None:
+    """
+    Создает мудборд проекта и сохраняет file_id изображений как его ассеты.
+
+    Если такой же мудборд (тот же промпт и вид) уже отправлялся, он пересылается по file_id
+    без запроса к Imagen и повторной загрузки. Если в памяти есть изображения для этого промпта,
+    запрос к Imagen тоже не нужен. В режиме коллажа четыре изображения собираются в одну сетку
+    в пуле потоков и загружаются одним файлом.
+
+    :param track_save: Получает задачу сохранения ассетов: она продолжается и после отмены генерации,
+        поэтому вызывающий должен дождаться ее, прежде чем удалять проект.
+    :return: file_id изображений или None, если мудборд не удалось сгенерировать.
+    """
+    prompt = moodboard_prompt(description)
+    cache_key = moodboard_cache_key(prompt, collage)
+
+    cached_assets = await get_assets_by_cache_key(AssetTypeEnum.MOODBOARD_IMAGE, cache_key)
+    if cached_assets:
+        file_ids = await _send_moodboard(bot, chat_id, [asset.telegram_file_id for asset in cached_assets], caption)
+    else:
+        prompt_hash = content_hash(prompt)
+        images = _image_sets.get(prompt_hash)
+        if images is None:
+            images = await generate_moodboard(description)
+            if not images:
+                return None
+            _image_sets.set(prompt_hash, images)
+
+        if collage:
+            collage_bytes = await compose_collage(images)
+            media = [BufferedInputFile(collage_bytes, filename=f"moodboard_{project_id}.jpg")]
+        else:
+            media = [
+                BufferedInputFile(data, filename=f"moodboard_{project_id}_{index}.png")
+                for index, data in enumerate(images, start=1)
+            ]
+        file_ids = await _send_moodboard(bot, chat_id, media, caption)
+
+    async def save_assets():
+        for file_id in file_ids:
+            await add_project_asset(
+                project_id=project_id,
+                asset_type=AssetTypeEnum.MOODBOARD_IMAGE,
+                telegram_file_id=file_id,
+                cache_key=cache_key
+            )
+
+    # Мудборд уже в чате: отмена генерации не должна оставить его без записей в БД
+    save = asyncio.create_task(save_assets(), name=f"moodboard-save-{project_id}")
+    if track_save:
+        track_save(save)
+    await asyncio.shield(save)
+    return file_ids
+
+
+async def send_saved_moodboard(bot: Bot, chat_id: int, assets: list[ProjectAsset]) -> bool:
+    """
+    Повторно отправляет сохраненный мудборд по file_id — без генерации и повторной загрузки.
+
+    :return: False, если у проекта нет мудборда.
+    """
+    file_ids = [asset.telegram_file_id for asset in assets if asset.asset_type == AssetTypeEnum.MOODBOARD_IMAGE]
+    if not file_ids:
+        return False
+    await _send_moodboard(bot, chat_id, file_ids)
+    return True
+
+
+class MoodboardTasks:
+    """
+    Реестр фоновых генераций мудбордов: не больше одной задачи на проект.
+    Идея сохраняется сразу, а мудборд приходит отдельным сообщением, когда будет готов.
+    """
+
+    def __init__(self):
+        self._tasks: dict[int, asyncio.Task] = {}
+        # Сохранение ассетов переживает отмену генерации, поэтому отслеживается отдельно
+        self._saves: dict[int, asyncio.Task] = {}
+
+    def is_running(self, project_id: int) -> bool:
+        task = self._tasks.get(project_id)
+        return task is not None and not task.done()
+
+    def start(
+        self,
+        bot: Bot,
+        chat_id: int,
+        project_id: int,
+        project_name: str,
+        description: str,
+        collage: bool = False
+    ) -> bool:
+        """
+        Запускает генерацию мудборда в фоне.
+
+        :return: False, если для проекта уже идет генерация.
+        """
+        if self.is_running(project_id):
+            return False
+        task = asyncio.create_task(
+            self._run(bot, chat_id, project_id, project_name, description, collage),
+            name=f"moodboard-{project_id}"
+        )
+        self._tasks[project_id] = task
+        task.add_done_callback(lambda _: self._forget(self._tasks, project_id, task))
+        return True
+
+    async def cancel(self, project_id: int) -> bool:
+        """
+        Отменяет генерацию мудборда проекта и дожидается ее остановки,
+        включая уже начатое сохранение ассетов: после этого проект можно удалять.
+
+        :return: False, если генерация не выполняется.
+        """
+        running = self.is_running(project_id)
+        if running:
+            task = self._tasks[project_id]
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        save = self._saves.get(project_id)
+        if save is not None:
+            await asyncio.gather(save, return_exceptions=True)
+        return running
+
+    async def shutdown(self):
+        """Отменяет все генерации при остановке бота и дожидается сохранения ассетов."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*self._saves.values(), return_exceptions=True)
+        self._tasks.clear()
+        self._saves.clear()
+
+    @staticmethod
+    def _forget(registry: dict[int, asyncio.Task], project_id: int, task: asyncio.Task):
+        if registry.get(project_id) is task:
+            del registry[project_id]
+
+    def _track_save(self, project_id: int, save: asyncio.Task):
+        self._saves[project_id] = save
+        save.add_done_callback(lambda _: self._forget(self._saves, project_id, save))
+
+    async def _run(self, bot: Bot, chat_id: int, project_id: int, project_name: str, description: str, collage: bool):
+        try:
+            file_ids = await create_project_moodboard(
+                bot, chat_id, project_id, description, collage,
+                caption=f"🎨 Мудборд для идеи «{project_name}»",
+                track_save=lambda save: self._track_save(project_id, save)
+            )
+        except asyncio.CancelledError:
+            logger.info("Moodboard generation for project %s cancelled", project_id)
+            raise
+        except Exception:
+            logger.exception("Moodboard generation for project %s failed", project_id)
+            file_ids = None
+
+        if not file_ids:
+            try:
+                await bot.send_message(chat_id, f"Не удалось сгенерировать мудборд для идеи «{project_name}».")
+            except Exception as e:
+                # Фоновую задачу никто не ждет: ошибку отправки только логируем
+                logger.warning("Failed to report moodboard failure for project %s: %s", project_id, e)
+
+
+# Глобальный реестр фоновых генераций мудбордов
+moodboard_tasks = MoodboardTasks()
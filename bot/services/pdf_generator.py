@@ -1,54 +1,212 @@
 # file: bot/services/pdf_generator.py
 
+import asyncio
 import io
+import threading
+from dataclasses import dataclass
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template
+from pypdf import PdfReader, PdfWriter
 from weasyprint import HTML, CSS
 from weasyprint.text.fonts import FontConfiguration
 
-# Создаем базовую конфигурацию Jinja. 
+from bot.config import settings
+from bot.services.cache import CacheStats, LRUCache
+from bot.services.generation_cache import content_hash, template_content_hash
+from bot.services.image_store import make_url_fetcher, mem_url
+from bot.services.pdf_profiles import PdfProfile, get_pdf_profile
+from bot.services.render_executor import render_executor
+
+# Создаем базовую конфигурацию Jinja.
 # FileSystemLoader здесь не используется напрямую, но это хороший задел на будущее.
 env = Environment(loader=FileSystemLoader('.'))
 
+
+@dataclass
+class CompiledTemplate:
+    """Скомпилированный шаблон, готовый к многократному рендерингу."""
+    template: Template
+    stylesheet: CSS | None
+    font_config: FontConfiguration
+
+
+# Кэш скомпилированных шаблонов по хэшу содержимого. Он свой у каждого потока:
+# LRUCache не потокобезопасен, а без пула процессов (pdf_render_workers=0) рендеринг
+# идет в нескольких потоках. В воркере пула поток один, так что кэш по сути на процесс.
+# Шаблоны не изменяются на месте, поэтому хэш однозначно задает компиляцию и сброс не нужен.
+_local = threading.local()
+
+# Счетчики попаданий собираются в главном процессе по результатам задач
+template_cache_stats = CacheStats()
+
+
+def _template_cache() -> LRUCache:
+    cache = getattr(_local, "template_cache", None)
+    if cache is None:
+        cache = _local.template_cache = LRUCache(maxsize=settings.template_cache_size)
+    return cache
+
+
+def validate_template_syntax(html_template_str: str):
+    """
+    Проверяет синтаксис Jinja-шаблона в главном процессе.
+
+    :raises jinja2.TemplateSyntaxError: Если шаблон содержит ошибку.
+    """
+    env.parse(html_template_str)
+
+
+def get_template_cache_stats() -> dict:
+    """Возвращает агрегированные счетчики кэша шаблонов."""
+    return template_cache_stats.as_dict()
+
+
+def _get_compiled_template(
+    template_hash: str,
+    html_template_str: str,
+    css_template_str: str | None
+) -> tuple[CompiledTemplate, bool]:
+    """Достает шаблон из кэша потока или компилирует его заново."""
+    cache = _template_cache()
+    compiled = cache.get(template_hash)
+    if compiled is not None:
+        return compiled, True
+
+    font_config = FontConfiguration()
+    compiled = CompiledTemplate(
+        template=env.from_string(html_template_str),
+        stylesheet=CSS(string=css_template_str, font_config=font_config) if css_template_str else None,
+        font_config=font_config,
+    )
+    cache.set(template_hash, compiled)
+    return compiled, False
+
+
+def _render_pdf(
+    project_name: str,
+    project_description: str,
+    image_keys: list[str],
+    image_data: dict[str, bytes],
+    template_hash: str,
+    html_template_str: str,
+    css_template_str: str | None,
+    current_date: str,
+    pdf_options: dict
+) -> tuple[bytes, bool]:
+    """
+    Синхронный рендеринг PDF. Выполняется в процессе пула рендеринга,
+    поэтому должен оставаться функцией уровня модуля.
+
+    :return: Байты PDF и признак попадания в кэш шаблонов.
+    """
+    compiled, cache_hit = _get_compiled_template(template_hash, html_template_str, css_template_str)
+
+    # Рендерим HTML, передавая в него данные
+    rendered_html = compiled.template.render(
+        project_name=project_name,
+        project_description=project_description,
+        images=[mem_url(key) for key in image_keys],
+        current_date=current_date
+    )
+
+    # Создаем объект HTML. Изображения отдаются из памяти через mem://<hash>,
+    # а base_url='.' оставлен для локальных ресурсов, на которые ссылается сам шаблон
+    html = HTML(string=rendered_html, base_url='.', url_fetcher=make_url_fetcher(image_data))
+
+    # Записываем PDF в байтовый поток в памяти
+    pdf_bytes_io = io.BytesIO()
+    html.write_pdf(
+        target=pdf_bytes_io,
+        stylesheets=[compiled.stylesheet] if compiled.stylesheet else None,
+        font_config=compiled.font_config,
+        **pdf_options
+    )
+
+    # Возвращаем байты из потока
+    return pdf_bytes_io.getvalue(), cache_hit
+
+
 async def create_project_card_pdf(
     project_name: str,
     project_description: str,
-    images_paths: list[str], # Список путей к локально скачанным изображениям
+    images: list[bytes], # Содержимое изображений в памяти, в порядке показа
     html_template_str: str,
-    css_template_str: str = None
+    css_template_str: str = None,
+    template_hash: str = None,
+    profile: PdfProfile = None
 ) -> bytes:
     """
     Генерирует PDF-карточку проекта на основе шаблонов и данных.
+    Рендеринг выполняется в пуле процессов и не блокирует event loop.
 
     :param project_name: Название проекта.
     :param project_description: Описание для карточки, сгенерированное LLM.
-    :param images_paths: Список путей к файлам изображений.
+    :param images: Список изображений (байты JPEG/PNG/WebP).
     :param html_template_str: Строка с HTML-шаблоном.
     :param css_template_str: Строка с CSS-шаблоном (опционально).
+    :param template_hash: Хэш содержимого шаблона (ключ кэша компиляции); если не передан, вычисляется.
+    :param profile: Профиль вывода (draft/screen/print), по умолчанию из настроек.
     :return: PDF-файл в виде байтов.
+    :raises RenderTimeoutError: Если рендеринг не уложился в таймаут.
     """
-    # Загружаем HTML-шаблон из строки
-    template = env.from_string(html_template_str)
-    
-    # Рендерим HTML, передавая в него данные
-    rendered_html = template.render(
-        project_name=project_name,
-        project_description=project_description,
-        images=images_paths,
-        current_date=datetime.now().strftime("%B %d, %Y")
+    image_keys = [content_hash(data) for data in images]
+    pdf_bytes, cache_hit = await render_executor.run(
+        _render_pdf,
+        project_name,
+        project_description,
+        image_keys,
+        dict(zip(image_keys, images)),
+        template_hash or template_content_hash(html_template_str, css_template_str),
+        html_template_str,
+        css_template_str,
+        datetime.now().strftime("%B %d, %Y"),
+        (profile or get_pdf_profile()).write_pdf_options()
     )
 
-    font_config = FontConfiguration()
-    
-    # Создаем объект HTML
-    html = HTML(string=rendered_html, base_url='.') # base_url='.' важен для локальных файлов
+    if cache_hit:
+        template_cache_stats.hits += 1
+    else:
+        template_cache_stats.misses += 1
+    return pdf_bytes
 
-    # Создаем объект CSS, если он предоставлен
-    css = CSS(string=css_template_str, font_config=font_config) if css_template_str else None
 
-    # Записываем PDF в байтовый поток в памяти
-    pdf_bytes_io = io.BytesIO()
-    html.write_pdf(target=pdf_bytes_io, stylesheets=[css] if css else None, font_config=font_config)
-    
-    # Возвращаем байты из потока
-    return pdf_bytes_io.getvalue()
\ No newline at end of file
+
+def _render_html(html_str: str, pdf_options: dict) -> bytes:
+    """Синхронный рендеринг готового HTML (без Jinja и кэша шаблонов)."""
+    return HTML(string=html_str, base_url='.').write_pdf(**pdf_options)
+
+
+def _merge_pdfs(documents: list[bytes], bookmarks: list[str | None]) -> bytes:
+    """
+    Синхронно склеивает PDF-документы в один.
+    Для каждого документа с непустым заголовком создается закладка на его первую страницу.
+    """
+    writer = PdfWriter()
+    for data, title in zip(documents, bookmarks):
+        writer.append(io.BytesIO(data), outline_item=title, import_outline=False)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _count_pdf_pages(pdf_bytes: bytes) -> int:
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+async def count_pdf_pages(pdf_bytes: bytes) -> int:
+    """
+    Возвращает количество страниц в PDF.
+    pypdf разбирает весь документ, поэтому подсчет идет в потоке, а не в event loop.
+    """
+    return await asyncio.to_thread(_count_pdf_pages, pdf_bytes)
+
+
+async def render_html_to_pdf(html_str: str, profile: PdfProfile = None) -> bytes:
+    """Рендерит произвольный HTML в PDF в пуле процессов."""
+    return await render_executor.run(_render_html, html_str, (profile or get_pdf_profile()).write_pdf_options())
+
+
+async def merge_pdfs(documents: list[bytes], bookmarks: list[str | None]) -> bytes:
+    """Склеивает PDF-документы в пуле процессов, добавляя закладки."""
+    return await render_executor.run(_merge_pdfs, documents, bookmarks)
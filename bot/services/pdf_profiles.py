@@ -0,0 +1,71 @@
+# file: bot/services/pdf_profiles.py
+
+from dataclasses import dataclass
+
+from bot.config import settings
+
+
+@dataclass(frozen=True)
+class PdfProfile:
+    """
+    Профиль вывода PDF: компромисс между скоростью рендеринга, размером файла и качеством.
+    Параметры соответствуют опциям HTML.write_pdf в WeasyPrint.
+    """
+    name: str
+    title: str
+    image_dpi: int           # Предел разрешения изображений (и для предобработки, и для WeasyPrint)
+    image_quality: int       # Качество JPEG
+    optimize_images: bool    # Разрешить WeasyPrint пережимать изображения
+    full_fonts: bool         # True — встраивать шрифты целиком, False — только используемые глифы
+    hinting: bool            # Сохранять хинтинг во встроенных шрифтах
+    pdf_variant: str | None = None  # Например, "pdf/a-3b"
+
+    def write_pdf_options(self) -> dict:
+        """Возвращает именованные аргументы для HTML.write_pdf."""
+        options = {
+            "optimize_images": self.optimize_images,
+            "jpeg_quality": self.image_quality,
+            "dpi": self.image_dpi,
+            "full_fonts": self.full_fonts,
+            "hinting": self.hinting,
+        }
+        if self.pdf_variant:
+            options["pdf_variant"] = self.pdf_variant
+        return options
+
+
+PDF_PROFILES: dict[str, PdfProfile] = {
+    "draft": PdfProfile(
+        name="draft",
+        title="⚡️ Черновик",
+        image_dpi=96,
+        image_quality=50,
+        optimize_images=True,
+        full_fonts=False,
+        hinting=False,
+    ),
+    "screen": PdfProfile(
+        name="screen",
+        title="🖥 Для экрана",
+        image_dpi=150,
+        image_quality=75,
+        optimize_images=True,
+        full_fonts=False,
+        hinting=False,
+    ),
+    "print": PdfProfile(
+        name="print",
+        title="🖨 Для печати",
+        image_dpi=300,
+        image_quality=92,
+        optimize_images=False,
+        full_fonts=True,
+        hinting=True,
+        pdf_variant="pdf/a-3b",
+    ),
+}
+
+
+def get_pdf_profile(name: str | None = None) -> PdfProfile:
+    """Возвращает профиль по имени или профиль по умолчанию из настроек."""
+    return PDF_PROFILES.get(name) or PDF_PROFILES.get(settings.pdf_default_profile) or PDF_PROFILES["screen"]
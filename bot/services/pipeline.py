@@ -0,0 +1,78 @@
+# file: bot/services/pipeline.py
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    deps: tuple[str, ...]
+
+
+class StageGraph:
+    """
+    Граф этапов (DAG). Каждый этап запускается, как только готовы его зависимости,
+    поэтому независимые этапы выполняются параллельно. Результаты зависимостей
+    передаются в функцию этапа позиционными аргументами в порядке объявления.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings: dict[str, float] = {}
+        self._stages: dict[str, Stage] = {}
+
+    def stage(self, name: str, *deps: str):
+        """
+        Декоратор для регистрации этапа.
+        Зависимости должны быть зарегистрированы раньше — так граф не может содержать циклов.
+        """
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            unknown = [dep for dep in deps if dep not in self._stages]
+            if unknown:
+                raise ValueError(f"Stage '{name}' depends on unknown stages: {unknown}")
+            self._stages[name] = Stage(name=name, func=func, deps=deps)
+            return func
+        return decorator
+
+    async def _run_stage(self, stage: Stage, tasks: dict[str, asyncio.Task]) -> Any:
+        args = [await tasks[dep] for dep in stage.deps]
+        started = time.perf_counter()
+        try:
+            return await stage.func(*args)
+        finally:
+            self.timings[stage.name] = time.perf_counter() - started
+
+    async def run(self) -> dict[str, Any]:
+        """
+        Выполняет все этапы.
+
+        :return: Результаты этапов по именам.
+        :raises Exception: Первая ошибка любого этапа; остальные этапы при этом отменяются.
+        """
+        started = time.perf_counter()
+        tasks: dict[str, asyncio.Task] = {}
+        for stage in self._stages.values():
+            tasks[stage.name] = asyncio.create_task(
+                self._run_stage(stage, tasks), name=f"{self.name}:{stage.name}"
+            )
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            total = time.perf_counter() - started
+            timings = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.timings.items())
+            logger.info("Pipeline %s finished in %.2f s: %s", self.name, total, timings)
+
+        return {name: task.result() for name, task in tasks.items()}
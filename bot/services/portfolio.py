@@ -0,0 +1,181 @@
+# file: bot/services/portfolio.py
+
+import asyncio
+import html
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+
+from bot.config import settings
+from bot.db.database import get_latest_project_asset, get_project_assets
+from bot.db.models import AssetTypeEnum, PdfTemplate, Project
+from bot.services.image_preprocess import parse_page_size_mm, preprocess_images
+from bot.services.image_store import download_telegram_file
+from bot.services.llm_service import PDF_CARD_PROMPT, generate_text_from_draft
+from bot.services.rate_limiter import Priority
+from bot.services.pdf_generator import count_pdf_pages, create_project_card_pdf, merge_pdfs, render_html_to_pdf
+from bot.services.pdf_profiles import PdfProfile
+
+logger = logging.getLogger(__name__)
+
+# (готово, всего) -> None
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+MAX_IMAGES_PER_CARD = 5
+
+# Лимит Telegram на отправку файлов ботом
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+_TOC_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<style>
+    @page {{ size: {page_size}; margin: 20mm; }}
+    body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #333; }}
+    h1 {{ font-size: 28pt; margin-bottom: 4mm; }}
+    .date {{ color: #888; margin-bottom: 12mm; }}
+    table {{ width: 100%; border-collapse: collapse; font-size: 12pt; }}
+    td {{ padding: 2.5mm 0; border-bottom: 0.5pt solid #ddd; }}
+    td.page {{ text-align: right; width: 20mm; }}
+</style>
+</head>
+<body>
+    <h1>Portfolio</h1>
+    <div class="date">{date}</div>
+    <table>{rows}</table>
+</body>
+</html>"""
+
+
+@dataclass
+class PortfolioCard:
+    """Карточка одного проекта внутри портфолио."""
+    project: Project
+    pdf: bytes | None = None
+    pages: int = 0
+    error: str | None = None
+
+
+async def _get_card_text(project: Project) -> str | None:
+    """Берет текст карточки из последней сгенерированной PDF, иначе генерирует его."""
+    cached = await get_latest_project_asset(project.id, AssetTypeEnum.GENERATED_PDF)
+    if cached and cached.text_content:
+        return cached.text_content
+    # Портфолио — пакетная задача: интерактивные генерации получают квоту LLM раньше
+    return await generate_text_from_draft(
+        PDF_CARD_PROMPT, f"Initial Idea: {project.description}", priority=Priority.BATCH
+    )
+
+
+async def _get_card_images(bot: Bot, project: Project) -> list[bytes]:
+    """Скачивает финальные рендеры проекта, а если их нет — фото-референс."""
+    assets = await get_project_assets(project.id)
+    renders = [asset for asset in assets if asset.asset_type == AssetTypeEnum.FINAL_RENDER]
+    if not renders:
+        renders = [asset for asset in assets if asset.asset_type == AssetTypeEnum.IMAGE_REFERENCE]
+    file_ids = [asset.telegram_file_id for asset in renders[:MAX_IMAGES_PER_CARD]]
+    return list(await asyncio.gather(*(download_telegram_file(bot, file_id) for file_id in file_ids)))
+
+
+def _build_toc_html(cards: list[PortfolioCard], first_page: int, page_size: str) -> str:
+    rows = []
+    page = first_page
+    for card in cards:
+        rows.append(
+            f'<tr><td>{html.escape(card.project.name)}</td><td class="page">{page}</td></tr>'
+        )
+        page += card.pages
+    return _TOC_TEMPLATE.format(
+        page_size=page_size,
+        date=datetime.now().strftime("%B %d, %Y"),
+        rows="".join(rows),
+    )
+
+
+async def _render_toc(cards: list[PortfolioCard], profile: PdfProfile, page_size_mm: tuple[float, float]) -> bytes:
+    """
+    Рендерит оглавление. Номера страниц зависят от длины самого оглавления,
+    поэтому при необходимости оглавление рендерится второй раз.
+    """
+    page_size = f"{page_size_mm[0]:.1f}mm {page_size_mm[1]:.1f}mm"
+    toc_pages = 1
+    toc_pdf = await render_html_to_pdf(_build_toc_html(cards, toc_pages + 1, page_size), profile)
+    actual_pages = await count_pdf_pages(toc_pdf)
+    if actual_pages != toc_pages:
+        toc_pdf = await render_html_to_pdf(_build_toc_html(cards, actual_pages + 1, page_size), profile)
+    return toc_pdf
+
+
+async def build_portfolio(
+    bot: Bot,
+    projects: list[Project],
+    template: PdfTemplate,
+    profile: PdfProfile,
+    on_progress: ProgressCallback = None
+) -> tuple[bytes, list[PortfolioCard]]:
+    """
+    Собирает портфолио: рендерит карточки проектов параллельно и склеивает их
+    в один PDF с оглавлением и закладками.
+
+    :param bot: Бот для скачивания изображений из Telegram.
+    :param projects: Проекты в порядке следования в портфолио.
+    :param template: Шаблон карточки.
+    :param profile: Профиль вывода PDF.
+    :param on_progress: Колбэк прогресса (готово, всего).
+    :return: PDF портфолио и список карточек (в том числе с ошибками).
+    :raises ValueError: Если не удалось собрать ни одной карточки.
+    """
+    cards = [PortfolioCard(project=project) for project in projects]
+    page_size_mm = parse_page_size_mm(template.html_template, template.css_template)
+    semaphore = asyncio.Semaphore(settings.portfolio_concurrency)
+    done = 0
+
+    async def build_card(card: PortfolioCard):
+        nonlocal done
+        async with semaphore:
+            try:
+                card_text, images = await asyncio.gather(
+                    _get_card_text(card.project),
+                    _get_card_images(bot, card.project)
+                )
+                if not card_text:
+                    raise ValueError("LLM не вернула текст карточки")
+                images, _ = await preprocess_images(
+                    images,
+                    page_size_mm=page_size_mm,
+                    dpi=profile.image_dpi,
+                    quality=profile.image_quality
+                )
+                card.pdf = await create_project_card_pdf(
+                    project_name=card.project.name,
+                    project_description=card_text,
+                    images=images,
+                    html_template_str=template.html_template,
+                    css_template_str=template.css_template,
+                    template_hash=template.content_hash,
+                    profile=profile
+                )
+                card.pages = await count_pdf_pages(card.pdf)
+            except Exception as e:
+                logger.warning("Portfolio card for project %s failed: %s", card.project.id, e)
+                card.error = str(e)
+        done += 1
+        if on_progress:
+            await on_progress(done, len(cards))
+
+    await asyncio.gather(*(build_card(card) for card in cards))
+
+    ready = [card for card in cards if card.pdf]
+    if not ready:
+        raise ValueError("Не удалось собрать ни одной карточки")
+
+    toc_pdf = await _render_toc(ready, profile, page_size_mm)
+    portfolio_pdf = await merge_pdfs(
+        [toc_pdf] + [card.pdf for card in ready],
+        ["Contents"] + [card.project.name for card in ready]
+    )
+    return portfolio_pdf, cards
@@ -0,0 +1,80 @@
+# file: bot/services/progress.py
+
+import time
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from bot.config import settings
+
+
+class StatusMessage:
+    """
+    Сообщение со статусом долгой операции, которое обновляется редактированием.
+    Частые обновления схлопываются: Telegram ограничивает частоту редактирования.
+    """
+
+    def __init__(
+        self,
+        message: Message | None = None,
+        min_interval: float = None,
+        *,
+        bot: Bot = None,
+        chat_id: int = None,
+        message_id: int = None
+    ):
+        """
+        :param message: Уже отправленное сообщение со статусом.
+        :param bot: Вместо message: бот, чат и ID существующего сообщения (например, после перезапуска бота).
+        """
+        if message is not None:
+            bot, chat_id, message_id = message.bot, message.chat.id, message.message_id
+        elif bot is None or chat_id is None or message_id is None:
+            raise ValueError("Нужно передать message или bot, chat_id и message_id")
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.min_interval = settings.progress_edit_interval if min_interval is None else min_interval
+        # Текст восстановленного сообщения неизвестен
+        self._last_text = (message.text or message.caption) if message is not None else None
+        self._last_edit = 0.0
+
+    @classmethod
+    async def send(cls, target: Message, text: str, min_interval: float = None) -> "StatusMessage":
+        """Отправляет новое статусное сообщение в чат target."""
+        message = await target.answer(text, parse_mode=ParseMode.HTML)
+        status = cls(message, min_interval)
+        status._last_edit = time.monotonic()
+        return status
+
+    async def update(self, text: str, force: bool = False) -> bool:
+        """
+        Обновляет текст сообщения.
+
+        :param force: Игнорировать ограничение частоты (для финальных статусов).
+        :return: True, если сообщение было отредактировано.
+        """
+        if text == self._last_text:
+            return False
+        if not force and time.monotonic() - self._last_edit < self.min_interval:
+            return False
+
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True
+            )
+        except TelegramRetryAfter:
+            # Уперлись в лимит — пропускаем промежуточное обновление
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._last_text = text
+        self._last_edit = time.monotonic()
+        return True
@@ -0,0 +1,210 @@
+# file: bot/services/rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Приоритет запроса: меньшее значение обслуживается раньше."""
+    INTERACTIVE = 0  # Пользователь ждет ответа в чате
+    BATCH = 1  # Фоновые пакетные задачи (портфолио)
+
+
+@dataclass
+class RateLimitStats:
+    """Счетчики ограничителя."""
+    acquired: int = 0
+    # Сколько запросов ждали свободной квоты и сколько всего ждали, в секундах
+    delayed: int = 0
+    total_wait: float = 0.0
+
+
+class TokenBucket:
+    """
+    Ограничитель по алгоритму token bucket: квота запросов в минуту и (опционально) токенов в минуту.
+    Квота пополняется непрерывно. Когда ее не хватает, вызывающий ждет:
+    ожидающие обслуживаются строго по приоритету, а внутри приоритета — по очереди.
+    Лимит 0 означает «без ограничений».
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int = 0):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.stats = RateLimitStats()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+
+    @property
+    def remaining_requests(self) -> int | None:
+        if self.requests_per_minute <= 0:
+            return None
+        self._refill()
+        return int(self._requests)
+
+    @property
+    def remaining_tokens(self) -> int | None:
+        if self.tokens_per_minute <= 0:
+            return None
+        self._refill()
+        return int(self._tokens)
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute > 0:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute > 0:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _cost(self, tokens: int) -> int:
+        # Запрос дороже всей квоты иначе ждал бы вечно
+        return min(tokens, self.tokens_per_minute)
+
+    def _can_take(self, tokens: int) -> bool:
+        if self.requests_per_minute > 0 and self._requests < 1:
+            return False
+        if self.tokens_per_minute > 0 and self._tokens < self._cost(tokens):
+            return False
+        return True
+
+    def _take(self, tokens: int):
+        if self.requests_per_minute > 0:
+            self._requests -= 1
+        if self.tokens_per_minute > 0:
+            self._tokens -= self._cost(tokens)
+        self.stats.acquired += 1
+
+    def _time_until_available(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests_per_minute > 0 and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute > 0 and self._tokens < self._cost(tokens):
+            wait = max(wait, (self._cost(tokens) - self._tokens) * 60 / self.tokens_per_minute)
+        return max(wait, 0.01)
+
+    async def acquire(self, tokens: int = 0, priority: Priority = Priority.INTERACTIVE) -> float:
+        """
+        Занимает квоту на один запрос стоимостью tokens токенов, дожидаясь ее при необходимости.
+
+        :return: Время ожидания в секундах.
+        """
+        if self.try_acquire(tokens):
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch(), name=f"rate-limiter-{self.name}")
+
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Квота уже выдана, но запрос отменен — возвращаем ее
+                self.refund(tokens, requests=1)
+            raise
+
+        waited = time.monotonic() - started
+        self.stats.delayed += 1
+        self.stats.total_wait += waited
+        logger.debug("Rate limiter '%s': waited %.2f s (priority %s)", self.name, waited, priority.name)
+        return waited
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """
+        Занимает квоту, только если она доступна прямо сейчас и ее не ждут другие запросы.
+
+        :return: True, если квота занята.
+        """
+        self._refill()
+        if self.waiting or not self._can_take(tokens):
+            return False
+        self._take(tokens)
+        return True
+
+    def refund(self, tokens: int, requests: int = 0):
+        """Возвращает неиспользованную квоту (например, если реальный ответ короче оценки)."""
+        self._refill()
+        if self.requests_per_minute > 0 and requests:
+            self._requests = min(self.requests_per_minute, self._requests + requests)
+        if self.tokens_per_minute > 0 and tokens:
+            self._tokens = min(self.tokens_per_minute, self._tokens + self._cost(tokens))
+
+    async def _dispatch(self):
+        """Выдает квоту ожидающим по мере пополнения."""
+        while self._waiters:
+            self._refill()
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self._can_take(tokens):
+                heapq.heappop(self._waiters)
+                self._take(tokens)
+                future.set_result(None)
+                continue
+            await asyncio.sleep(self._time_until_available(tokens))
+
+    def as_dict(self) -> dict:
+        return {
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "waiting": self.waiting,
+            "acquired": self.stats.acquired,
+            "delayed": self.stats.delayed,
+            "avg_wait": self.stats.total_wait / self.stats.delayed if self.stats.delayed else 0.0,
+        }
+
+
+class RateLimiter:
+    """
+    Реестр ограничителей для всех исходящих запросов к AI-сервисам: отдельная квота
+    на каждую пару провайдер/модель. Квоты берутся из настроек, переопределения для
+    конкретных моделей — из settings.rate_limit_overrides.
+    """
+
+    def __init__(self):
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def bucket(self, provider: str, model: str) -> TokenBucket:
+        name = f"{provider}:{model}"
+        if name not in self._buckets:
+            requests_per_minute, tokens_per_minute = self._budget(provider, name)
+            self._buckets[name] = TokenBucket(name, requests_per_minute, tokens_per_minute)
+        return self._buckets[name]
+
+    @staticmethod
+    def _budget(provider: str, name: str) -> tuple[int, int]:
+        if provider == "imagen":
+            requests_per_minute, tokens_per_minute = settings.imagen_requests_per_minute, 0
+        else:
+            requests_per_minute, tokens_per_minute = settings.llm_requests_per_minute, settings.llm_tokens_per_minute
+        requests_per_minute = settings.rate_limit_overrides.get(name, requests_per_minute)
+        return requests_per_minute, tokens_per_minute
+
+    def as_dict(self) -> dict[str, dict]:
+        return {name: bucket.as_dict() for name, bucket in self._buckets.items()}
+
+
+# Общий ограничитель для запросов к LLM и Imagen
+ai_rate_limiter = RateLimiter()
@@ -0,0 +1,219 @@
+# file: bot/services/render_executor.py
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RenderTimeoutError(Exception):
+    """Рендеринг не уложился в отведенное время."""
+
+
+class RenderWorkerError(Exception):
+    """Процесс рендеринга аварийно завершился во время задачи."""
+
+
+def _warm_up_worker():
+    """
+    Инициализатор процесса-воркера.
+    Импортирует WeasyPrint и поднимает fontconfig один раз при старте процесса,
+    чтобы первая задача не платила за это несколько секунд.
+    """
+    # pylint: disable=import-outside-toplevel,unused-import
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+
+    FontConfiguration()
+
+
+def _ping() -> int:
+    """Пустая задача для прогрева воркеров."""
+    return os.getpid()
+
+
+def _worker_main(conn):
+    """Цикл процесса-воркера: получает задачи из канала и отправляет обратно результат или ошибку."""
+    _warm_up_worker()
+    while True:
+        try:
+            call = conn.recv()
+        except EOFError:
+            return
+        if call is None:
+            return
+        try:
+            reply = (True, call())
+        except Exception as e:  # pylint: disable=broad-except
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:  # pylint: disable=broad-except
+            # Результат или исключение не сериализуются — передаем хотя бы текст ошибки
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    """Отдельный процесс рендеринга со своим каналом: его можно остановить, не трогая остальные."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def call(self, call: Callable[[], Any]) -> Any:
+        """Выполняет задачу в процессе (блокирующий вызов, запускается в потоке)."""
+        self.conn.send(call)
+        try:
+            ok, value = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise RenderWorkerError(f"Процесс рендеринга {self.process.pid} завершился") from e
+        if not ok:
+            raise value
+        return value
+
+    # kill и close блокируют на время ожидания процесса — вызываются через asyncio.to_thread
+
+    def kill(self):
+        self.process.kill()
+        # Поток, ждущий ответа, получит EOF и завершится сам
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def close(self, timeout: float = 1):
+        """Просит процесс завершиться, а если он не успел за timeout секунд, убивает его."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class RenderExecutor:
+    """
+    Пул процессов для тяжелого CPU-bound рендеринга (WeasyPrint).
+    Позволяет не блокировать event loop aiogram на время генерации PDF.
+
+    Каждый воркер — отдельный процесс со своим каналом. Зависшая или упавшая задача
+    приводит к перезапуску только ее воркера; задачи в остальных воркерах продолжаются.
+    """
+
+    def __init__(self, workers: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        # spawn вместо fork: форкать процесс с запущенным event loop и потоками небезопасно
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: asyncio.Queue[_Worker] | None = None
+        self._all: set[_Worker] = set()
+        # Потоки, ожидающие ответа воркеров: по одному на воркер
+        self._threads: ThreadPoolExecutor | None = None
+
+    async def _spawn(self) -> _Worker:
+        # Запуск интерпретатора занимает заметное время — не блокируем event loop
+        worker = await asyncio.to_thread(_Worker, self._context)
+        self._all.add(worker)
+        return worker
+
+    async def start(self):
+        """Запускает и прогревает все воркеры."""
+        if self.workers <= 0 or self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        workers = await asyncio.gather(*(self._spawn() for _ in range(self.workers)))
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(loop.run_in_executor(self._threads, worker.call, _ping) for worker in workers))
+        for worker in workers:
+            self._idle.put_nowait(worker)
+        logger.info("Render pool started with %d workers: %s", self.workers, sorted(pids))
+
+    async def shutdown(self):
+        """Останавливает воркеры, не дожидаясь зависших задач."""
+        if self._idle is None:
+            return
+        workers = list(self._all)
+        self._all.clear()
+        self._idle = None
+        await asyncio.gather(*(asyncio.to_thread(worker.close) for worker in workers))
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._threads = None
+        logger.info("Render pool stopped")
+
+    async def _replace(self, worker: _Worker):
+        """Останавливает один воркер и ставит на его место новый."""
+        self._all.discard(worker)
+        # Процесс может завершаться несколько секунд — не блокируем event loop
+        await asyncio.to_thread(worker.kill)
+        idle = self._idle
+        if idle is None:
+            return
+        new_worker = await self._spawn()
+        if self._idle is not idle:
+            # Пул остановили, пока запускался новый процесс
+            self._all.discard(new_worker)
+            await asyncio.to_thread(new_worker.close)
+            return
+        idle.put_nowait(new_worker)
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполняет функцию вне event loop с ограничением по времени.
+
+        :param func: Функция уровня модуля (должна сериализоваться через pickle).
+        :return: Результат функции.
+        :raises RenderTimeoutError: Если задача не уложилась в таймаут.
+        :raises RenderWorkerError: Если процесс воркера упал во время задачи.
+        """
+        loop = asyncio.get_running_loop()
+        call = partial(func, *args, **kwargs)
+
+        if self.workers <= 0:
+            future = loop.run_in_executor(None, call)
+            try:
+                return await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError as e:
+                raise RenderTimeoutError(f"Рендеринг не уложился в {self.timeout:.0f} с") from e
+
+        if self._idle is None:
+            await self.start()
+        worker = await self._idle.get()
+        future = loop.run_in_executor(self._threads, worker.call, call)
+        try:
+            result = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError as e:
+            logger.warning("Render job exceeded %.0f s, restarting worker %s", self.timeout, worker.process.pid)
+            await self._replace(worker)
+            raise RenderTimeoutError(f"Рендеринг не уложился в {self.timeout:.0f} с") from e
+        except RenderWorkerError:
+            logger.error("Render worker %s crashed, restarting it", worker.process.pid)
+            await self._replace(worker)
+            raise
+        except asyncio.CancelledError:
+            # Задачу отменили снаружи: ответ воркера уже некому читать — перезапускаем его
+            await asyncio.shield(self._replace(worker))
+            raise
+        except Exception:
+            # Ошибка самой задачи: воркер исправен
+            self._idle.put_nowait(worker)
+            raise
+        self._idle.put_nowait(worker)
+        return result
+
+
+# Глобальный экземпляр, общий для всего приложения
+render_executor = RenderExecutor(
+    workers=settings.pdf_render_workers,
+    timeout=settings.pdf_render_timeout,
+)
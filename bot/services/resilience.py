@@ -0,0 +1,200 @@
+# file: bot/services/resilience.py
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: предохранитель разомкнут после серии ошибок."""
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Разбирает заголовок Retry-After: число секунд или HTTP-дата.
+
+    :return: Задержка в секундах или None, если заголовка нет или он некорректен.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Повторы с экспоненциальной задержкой и полным джиттером."""
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """
+        Задержка перед повтором номер attempt (с нуля).
+        Если сервер прислал Retry-After, ждем не меньше указанного им времени.
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            return max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+
+class Admission(IntEnum):
+    """Ответ предохранителя на запрос: ложен, если запрос отправлять нельзя."""
+    DENIED = 0
+    ALLOWED = 1
+    # Единственный пробный запрос в состоянии half-open: после него нужно вызвать release()
+    PROBE = 2
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: после failure_threshold ошибок подряд размыкается на reset_timeout секунд.
+    Затем пропускает один пробный запрос (half-open): успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> Admission:
+        """Можно ли сейчас отправить запрос и является ли он пробным."""
+        state = self.state
+        if state == "closed":
+            return Admission.ALLOWED
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return Admission.PROBE
+        return Admission.DENIED
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit '%s' closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Circuit '%s' opened after %d failures", self.name, self.failures)
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Снимает отметку пробного запроса. Вызывается только владельцем пробы (allow() вернул PROBE)
+        после ее завершения: если исход не записан (запрос отменили), без этого цепь
+        больше не пропустила бы ни одного запроса.
+        """
+        self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных запросов для расчета перцентилей."""
+
+    def __init__(self, window: int = 100):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """Перцентиль p (от 0 до 1) или None, если замеров нет."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(int(p * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+
+# Попытка запроса. Получает функцию claim(): вызов возвращает True, если эта попытка
+# первой начала отдавать результат (остальные попытки при этом отменяются).
+HedgedAttempt = Callable[[Callable[[], bool]], Awaitable[Any]]
+
+
+async def run_hedged(
+    attempt: HedgedAttempt,
+    hedge_after: float | None,
+    can_hedge: Callable[[], bool] | None = None
+) -> tuple[Any, bool]:
+    """
+    Запускает попытку и, если за hedge_after секунд она не завершилась и не начала
+    отдавать результат, параллельно запускает дубликат. Побеждает первая успешная попытка
+    (или первая вызвавшая claim), проигравшая отменяется.
+
+    :param can_hedge: Вызывается перед отправкой дубликата; False — дубликат не отправляется
+        (например, если на него нет свободной квоты).
+
+    :return: (результат, был ли отправлен дубликат).
+    :raises Exception: Ошибка последней упавшей попытки, если успешных нет.
+    """
+    tasks: list[asyncio.Task] = []
+    winner: list[asyncio.Task] = []
+
+    def make_claim(index: int) -> Callable[[], bool]:
+        def claim() -> bool:
+            if not winner:
+                winner.append(tasks[index])
+                for task in tasks:
+                    if task is not tasks[index]:
+                        task.cancel()
+            return winner[0] is tasks[index]
+        return claim
+
+    tasks.append(asyncio.create_task(attempt(make_claim(0))))
+    hedged = False
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and not winner and (can_hedge is None or can_hedge()):
+                tasks.append(asyncio.create_task(attempt(make_claim(1))))
+                hedged = True
+
+        pending = set(tasks)
+        last_error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is None:
+                    return task.result(), hedged
+                last_error = task.exception()
+        raise last_error or asyncio.CancelledError()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,78 @@
+"""baseline schema
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_baseline'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(name: str) -> bool:
+    # Базы, созданные через create_all до появления миграций, уже содержат эти таблицы
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("projects"):
+        op.create_table(
+            "projects",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("name", sa.String(length=255), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("status", sa.Enum("IDEA", "ACTIVE", "ARCHIVED", name="statusenum"), nullable=False),
+            sa.Column("reminder_interval_days", sa.Integer(), nullable=True),
+            sa.Column("last_reminded_at", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    if not _has_table("pdf_templates"):
+        op.create_table(
+            "pdf_templates",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.Column("html_template", sa.Text(), nullable=False),
+            sa.Column("css_template", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("name"),
+        )
+    if not _has_table("project_assets"):
+        op.create_table(
+            "project_assets",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("project_id", sa.Integer(), nullable=False),
+            sa.Column(
+                "asset_type",
+                sa.Enum(
+                    "IMAGE_REFERENCE", "FINAL_RENDER", "MOODBOARD_IMAGE", "GENERATED_PDF", "SOCIAL_TEXT",
+                    name="assettypeenum"
+                ),
+                nullable=False,
+            ),
+            sa.Column("telegram_file_id", sa.String(length=255), nullable=False),
+            sa.Column("text_content", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("project_assets")
+    op.drop_table("pdf_templates")
+    op.drop_table("projects")
+    sa.Enum(name="assettypeenum").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="statusenum").drop(op.get_bind(), checkfirst=True)
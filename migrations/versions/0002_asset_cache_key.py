@@ -0,0 +1,38 @@
+"""asset cache keys for generated outputs
+
+Revision ID: 0002_asset_cache_key
+Revises: 0001_baseline
+Create Date: 2026-10-18 12:02:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_asset_cache_key'
+down_revision: Union[str, Sequence[str], None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(table: str, column: str) -> bool:
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ключ генерации у ассетов; текстовые ассеты хранятся без file_id.
+    # batch-режим нужен SQLite, который не умеет ALTER COLUMN
+    with op.batch_alter_table("project_assets") as batch_op:
+        if not _has_column("project_assets", "cache_key"):
+            batch_op.add_column(sa.Column("cache_key", sa.String(length=64), nullable=True))
+        batch_op.alter_column("telegram_file_id", existing_type=sa.String(length=255), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("project_assets") as batch_op:
+        batch_op.drop_column("cache_key")
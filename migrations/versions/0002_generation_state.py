@@ -0,0 +1,79 @@
+"""generation jobs and llm cache
+
+Revision ID: 0002_generation_state
+Revises: 0002_asset_cache_key
+Create Date: 2026-10-18 12:05:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_generation_state'
+down_revision: Union[str, Sequence[str], None] = '0002_asset_cache_key'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("generation_jobs"):
+        op.create_table(
+            "generation_jobs",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("chat_id", sa.BigInteger(), nullable=False),
+            sa.Column("status_message_id", sa.Integer(), nullable=True),
+            sa.Column("project_id", sa.Integer(), nullable=False),
+            sa.Column("template_id", sa.Integer(), nullable=False),
+            sa.Column("profile", sa.String(length=20), nullable=True),
+            sa.Column("draft_text", sa.Text(), nullable=False),
+            sa.Column("images", sa.JSON(), nullable=False),
+            sa.Column(
+                "status",
+                sa.Enum("QUEUED", "RUNNING", "DONE", "FAILED", name="jobstatusenum"),
+                nullable=False,
+            ),
+            sa.Column(
+                "stage",
+                sa.Enum("CREATED", "TEXTS_READY", "PDF_SENT", "FINISHED", name="jobstageenum"),
+                nullable=False,
+            ),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("card_text", sa.Text(), nullable=True),
+            sa.Column("social_text", sa.Text(), nullable=True),
+            sa.Column("social_sent", sa.Boolean(), nullable=False),
+            sa.Column("regenerate", sa.Boolean(), nullable=False),
+            sa.Column("pdf_file_id", sa.String(length=255), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["template_id"], ["pdf_templates.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+    if not _has_table("llm_response_cache"):
+        op.create_table(
+            "llm_response_cache",
+            sa.Column("key", sa.String(length=64), nullable=False),
+            sa.Column("model", sa.String(length=255), nullable=False),
+            sa.Column("response", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("expires_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("key"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("llm_response_cache")
+    op.drop_table("generation_jobs")
+    sa.Enum(name="jobstageenum").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="jobstatusenum").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,48 @@
+"""indexes for hot query paths
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_generation_state
+Create Date: 2026-10-18 12:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_hot_path_indexes'
+down_revision: Union[str, Sequence[str], None] = '0002_generation_state'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя индекса, таблица, колонки) — совпадают с __table_args__ моделей
+INDEXES = [
+    ("ix_projects_status_created_at", "projects", ["status", "created_at"]),
+    ("ix_projects_status_reminder_interval", "projects", ["status", "reminder_interval_days"]),
+    ("ix_projects_created_at", "projects", ["created_at"]),
+    ("ix_project_assets_project_id_type_created_at", "project_assets", ["project_id", "asset_type", "created_at"]),
+    ("ix_project_assets_type_cache_key_created_at", "project_assets", ["asset_type", "cache_key", "created_at"]),
+    ("ix_generation_jobs_status_id", "generation_jobs", ["status", "id"]),
+    ("ix_llm_response_cache_expires_at", "llm_response_cache", ["expires_at"]),
+    ("ix_llm_response_cache_created_at", "llm_response_cache", ["created_at"]),
+]
+
+
+def _existing_indexes(table: str) -> set[str]:
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        # Свежие базы получают индексы еще при create_all
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,64 @@
+"""content hash for pdf templates
+
+Revision ID: 0004_template_content_hash
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-18 12:15:00
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_template_content_hash'
+down_revision: Union[str, Sequence[str], None] = '0003_hot_path_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(table: str, column: str) -> bool:
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _content_hash(html: str, css: str | None) -> str:
+    # Копия generation_cache.template_content_hash: миграция не зависит от кода бота
+    digest = hashlib.sha256(html.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((css or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_column("pdf_templates", "content_hash"):
+        with op.batch_alter_table("pdf_templates") as batch_op:
+            batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+
+    # Заполняем хэши уже сохраненных шаблонов
+    templates = sa.table(
+        "pdf_templates",
+        sa.column("id", sa.Integer),
+        sa.column("html_template", sa.Text),
+        sa.column("css_template", sa.Text),
+        sa.column("content_hash", sa.String),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(templates.c.id, templates.c.html_template, templates.c.css_template)
+        .where(templates.c.content_hash.is_(None))
+    ).all()
+    for template_id, html, css in rows:
+        bind.execute(
+            templates.update()
+            .where(templates.c.id == template_id)
+            .values(content_hash=_content_hash(html or "", css))
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("pdf_templates") as batch_op:
+        batch_op.drop_column("content_hash")
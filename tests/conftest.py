@@ -0,0 +1,11 @@
+# file: tests/conftest.py
+
+import os
+import tempfile
+
+# Обязательные настройки бота: bot.config читает их при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("TELEGRAM_USER_ID", "1")
+os.environ.setdefault("LLM_API_KEY", "test")
+os.environ.setdefault("GOOGLE_AI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
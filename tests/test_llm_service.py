@@ -0,0 +1,199 @@
+# file: tests/test_llm_service.py
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from bot.config import settings
+from bot.services import llm_service
+from bot.services.llm_service import LlmRequestMetrics, LlmStats, _request_with_fallbacks
+from bot.services.rate_limiter import Priority, RateLimiter
+from bot.services.resilience import Admission, RetryPolicy
+
+TOKENS_PER_MINUTE = 600
+# 40 символов — 11 токенов по оценке _estimate_prompt_tokens
+PROMPT = "x" * 40
+PROMPT_TOKENS = 11
+JSON_DATA = {"messages": [{"role": "user", "content": PROMPT}], "max_tokens": 100}
+
+
+@pytest.fixture(autouse=True)
+def llm_env(monkeypatch):
+    """Две модели, без задержек между повторами и со свежими предохранителями, квотами и метриками."""
+    monkeypatch.setattr(settings, "llm_model", ["model-a", "model-b"])
+    monkeypatch.setattr(settings, "llm_stream", False)
+    monkeypatch.setattr(settings, "llm_tokens_per_minute", TOKENS_PER_MINUTE)
+    monkeypatch.setattr(settings, "llm_requests_per_minute", 100)
+    monkeypatch.setattr(settings, "llm_hedge_percentile", 0)
+    monkeypatch.setattr(llm_service, "llm_retry_policy", RetryPolicy(max_attempts=2, base_delay=0, max_delay=0))
+    monkeypatch.setattr(llm_service, "ai_rate_limiter", RateLimiter())
+    monkeypatch.setattr(llm_service, "llm_stats", LlmStats())
+    monkeypatch.setattr(llm_service, "_breakers", {})
+    monkeypatch.setattr(llm_service, "_latencies", {})
+
+
+def stub_complete(monkeypatch, handler):
+    """Подменяет отправку запроса: handler(model, claim) возвращает текст или бросает исключение."""
+    calls = []
+
+    async def complete(headers, json_data, on_chunk, claim):
+        calls.append(json_data["model"])
+        text = await handler(json_data["model"], claim)
+        return text, LlmRequestMetrics(streamed=False, duration=0.01, completion_tokens=10)
+
+    monkeypatch.setattr(llm_service, "_complete", complete)
+    return calls
+
+
+def http_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", settings.llm_api_endpoint)
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+def request() -> tuple[str, LlmRequestMetrics, str]:
+    return asyncio.run(_request_with_fallbacks({}, JSON_DATA, None, Priority.INTERACTIVE))
+
+
+def remaining_tokens(model: str) -> int:
+    return llm_service.ai_rate_limiter.bucket("openrouter", model).remaining_tokens
+
+
+def test_returns_first_model_answer_and_refunds_unused_tokens(monkeypatch):
+    async def handler(model, claim):
+        return f"answer from {model}"
+
+    calls = stub_complete(monkeypatch, handler)
+
+    text, metrics, model = request()
+
+    assert (text, model) == ("answer from model-a", "model-a")
+    assert metrics.completion_tokens == 10
+    assert calls == ["model-a"]
+    # Списаны только промпт и реально сгенерированные токены
+    assert remaining_tokens("model-a") == TOKENS_PER_MINUTE - PROMPT_TOKENS - 10
+
+
+def test_non_retryable_error_falls_back_to_next_model(monkeypatch):
+    async def handler(model, claim):
+        if model == "model-a":
+            raise http_error(400)
+        return "ok"
+
+    calls = stub_complete(monkeypatch, handler)
+
+    _, _, model = request()
+
+    assert model == "model-b"
+    assert calls == ["model-a", "model-b"]
+    assert llm_service.llm_stats.fallbacks == 1
+    # Модель ответила, хоть и отказом: предохранитель не считает это сбоем
+    assert llm_service.get_circuit_breaker("model-a").failures == 0
+
+
+def test_retryable_error_is_retried_on_same_model(monkeypatch):
+    failures = [httpx.ConnectError("connection refused")]
+
+    async def handler(model, claim):
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    calls = stub_complete(monkeypatch, handler)
+
+    _, _, model = request()
+
+    assert model == "model-a"
+    assert calls == ["model-a", "model-a"]
+    assert llm_service.llm_stats.retries == 1
+
+
+def test_failed_requests_refund_reserved_tokens(monkeypatch):
+    async def handler(model, claim):
+        raise http_error(400)
+
+    stub_complete(monkeypatch, handler)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        request()
+
+    # Резерв под ответ возвращен, списан только промпт
+    assert remaining_tokens("model-a") == TOKENS_PER_MINUTE - PROMPT_TOKENS
+    assert remaining_tokens("model-b") == TOKENS_PER_MINUTE - PROMPT_TOKENS
+
+
+def test_cancelled_probe_releases_circuit(monkeypatch):
+    async def handler(model, claim):
+        await asyncio.sleep(3600)
+
+    stub_complete(monkeypatch, handler)
+    breaker = llm_service.get_circuit_breaker("model-a")
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+    async def run():
+        task = asyncio.create_task(_request_with_fallbacks({}, JSON_DATA, None, Priority.INTERACTIVE))
+        await asyncio.sleep(0.05)
+        assert not breaker.allow()  # Пробный запрос в процессе
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+@pytest.mark.parametrize("requests_per_minute, hedged", [(100, 1), (1, 0)])
+def test_hedge_is_sent_only_with_free_quota(monkeypatch, requests_per_minute, hedged):
+    monkeypatch.setattr(settings, "llm_requests_per_minute", requests_per_minute)
+    monkeypatch.setattr(llm_service, "_hedge_delay", lambda model: 0.01)
+
+    async def handler(model, claim):
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    calls = stub_complete(monkeypatch, handler)
+
+    request()
+
+    assert llm_service.llm_stats.hedged == hedged
+    assert len(calls) == 1 + hedged
+
+
+def test_malformed_response_counts_as_model_failure(monkeypatch):
+    async def handler(model, claim):
+        if model == "model-a":
+            raise KeyError("choices")
+        return "ok"
+
+    stub_complete(monkeypatch, handler)
+
+    _, _, model = request()
+
+    assert model == "model-b"
+    assert llm_service.get_circuit_breaker("model-a").failures == 1
+
+
+def test_request_started_while_closed_keeps_foreign_probe(monkeypatch):
+    async def handler(model, claim):
+        await asyncio.sleep(3600)
+
+    stub_complete(monkeypatch, handler)
+    breaker = llm_service.get_circuit_breaker("model-a")
+
+    async def run():
+        # Долгий запрос начат, пока цепь замкнута
+        slow = asyncio.create_task(_request_with_fallbacks({}, JSON_DATA, None, Priority.INTERACTIVE))
+        await asyncio.sleep(0.05)
+        # Тем временем цепь разомкнулась и чужой запрос занял пробу
+        breaker.opened_at = time.monotonic() - breaker.reset_timeout
+        assert breaker.allow() is Admission.PROBE
+        slow.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await slow
+        # Проба все еще занята: снять ее может только владелец
+        return breaker.allow()
+
+    assert asyncio.run(run()) is Admission.DENIED
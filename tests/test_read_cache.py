@@ -0,0 +1,140 @@
+# file: tests/test_read_cache.py
+
+import asyncio
+import json
+
+import pytest
+
+from bot.db import database
+from bot.db.database import (
+    async_session_factory,
+    add_project_asset,
+    create_project_idea,
+    engine,
+    get_project_by_id,
+    get_project_card,
+    update_project_details,
+    update_project_status
+)
+from bot.db.models import AssetTypeEnum, Base, StatusEnum
+from bot.db.read_cache import MemoryCacheBackend, ReadThroughCache
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch) -> ReadThroughCache:
+    """Свежий кэш чтений для каждого теста."""
+    fresh = ReadThroughCache(MemoryCacheBackend(maxsize=64), ttl=60)
+    monkeypatch.setattr(database, "db_cache", fresh)
+    return fresh
+
+
+def run(coro):
+    """Выполняет сценарий на чистой схеме; пул соединений привязан к event loop, поэтому закрываем его."""
+    async def scenario():
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+def test_miss_then_hit(cache):
+    async def scenario():
+        project = await create_project_idea("Лампа", "Настольная лампа")
+        first = await get_project_by_id(project.id)
+        second = await get_project_by_id(project.id)
+        return project, first, second
+
+    project, first, second = run(scenario())
+
+    assert (cache.stats.misses, cache.stats.hits) == (1, 1)
+    assert first.name == second.name == "Лампа"
+    assert second.id == project.id
+    assert second.status is StatusEnum.IDEA
+
+
+def test_project_card_round_trips_through_cache(cache):
+    async def scenario():
+        project = await create_project_idea("Лампа")
+        await add_project_asset(project.id, AssetTypeEnum.IMAGE_REFERENCE, telegram_file_id="cover")
+        loaded = await get_project_card(project.id)
+        cached = await get_project_card(project.id)
+        return loaded, cached
+
+    loaded, cached = run(scenario())
+
+    assert cache.stats.hits == 1
+    assert (cached.cover_file_id, cached.has_moodboard) == ("cover", False)
+    assert cached.project.name == loaded.project.name == "Лампа"
+
+
+def test_write_invalidates_cached_value(cache):
+    async def scenario():
+        project = await create_project_idea("Лампа")
+        await get_project_by_id(project.id)
+        await update_project_details(project.id, name="Торшер")
+        return await get_project_by_id(project.id)
+
+    project = run(scenario())
+
+    assert project.name == "Торшер"
+    assert cache.stats.misses == 2
+    assert cache.stats.hits == 0
+
+
+def test_reads_bypass_cache_after_write_in_same_session(cache):
+    async def scenario():
+        project = await create_project_idea("Лампа")
+        async with async_session_factory() as session:
+            await update_project_status(project.id, StatusEnum.ACTIVE, session=session)
+            # Незафиксированное изменение видно в сессии, но не должно попасть в кэш
+            inside = await get_project_by_id(project.id, session=session)
+            cached = await cache.backend.get(f"project:{project.id}")
+            await session.commit()
+            await cache.finish_session(session)
+        after = await get_project_by_id(project.id)
+        return inside, cached, after
+
+    inside, cached, after = run(scenario())
+
+    assert inside.status is StatusEnum.ACTIVE
+    assert cached is None
+    assert cache.bypassed == 1
+    assert after.status is StatusEnum.ACTIVE
+
+
+def test_load_racing_with_invalidation_is_not_cached(cache):
+    async def scenario():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_load():
+            loading.set()
+            await release.wait()
+            return {"name": "старое"}
+
+        def get(load):
+            return cache.get_or_load("key", load, dump=lambda value: value, restore=lambda data: data)
+
+        reader = asyncio.create_task(get(slow_load))
+        await loading.wait()
+        # Запись фиксируется, пока чтение еще загружает старые данные
+        await cache.invalidate(["key"])
+        release.set()
+        stale = await reader
+
+        async def fresh_load():
+            return {"name": "новое"}
+
+        return stale, await get(fresh_load), await cache.backend.get("key")
+
+    stale, fresh, stored = asyncio.run(scenario())
+
+    assert stale == {"name": "старое"}
+    assert fresh == {"name": "новое"}
+    assert json.loads(stored) == {"name": "новое"}
+    assert cache.stale_loads == 1